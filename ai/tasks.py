@@ -1,7 +1,9 @@
 from celery import shared_task
 from django.conf import settings
 from product.models import Product
-from product.serializers import ProductSerializer
+from product.serializers import ProductListSerializer
+from product.listing import listing_values
+from product.search import search_products
 import google.generativeai as genai
 import json
 import re
@@ -64,8 +66,7 @@ def analyze_product_query_task(self, user_message, conversation_history=None):
 
 
         if parsed.get("keywords"):
-            for kw in parsed["keywords"]:
-                products = products.filter(name__icontains=kw)
+            products = search_products(products, " ".join(parsed["keywords"]))
 
         if parsed.get("max_price"):
             products = products.filter(price__lte=parsed["max_price"])
@@ -73,7 +74,7 @@ def analyze_product_query_task(self, user_message, conversation_history=None):
         if parsed.get("min_price"):
             products = products.filter(price__gte=parsed["min_price"])
 
-        serialized = ProductSerializer(products[:10], many=True).data
+        serialized = ProductListSerializer(listing_values(products)[:10], many=True).data
 
         return {
             "query_analysis": parsed,
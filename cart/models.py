@@ -1,3 +1,27 @@
 from django.db import models
+from django.contrib.auth import get_user_model
+from product.models import Product
 
-# Create your models here.
+User = get_user_model()
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a product sitting in a user's cart.
+    The product's amount is already decremented by ``quantity``; the hold is
+    returned to stock when it is released or once ``expires_at`` passes.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"user:{self.user_id} product:{self.product_id} x{self.quantity}"
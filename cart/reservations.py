@@ -0,0 +1,245 @@
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from product.models import Product
+from product.stock import sync_stock
+from .models import StockReservation
+from .services import CACHE_TIMEOUT
+
+
+# Holds live exactly as long as the cart that owns them.
+RESERVATION_TIMEOUT = timedelta(seconds=CACHE_TIMEOUT)
+
+
+class ReservationService:
+    """Moves stock between ``Product.amount`` and per-cart reservations."""
+
+    @staticmethod
+    def _return_stock(quantities):
+        """Add ``{product_id: quantity}`` back to stock in a single UPDATE."""
+        quantities = {pid: qty for pid, qty in quantities.items() if qty}
+        if not quantities:
+            return
+        Product.objects.filter(id__in=quantities.keys()).update(
+            amount=F('amount') + Case(
+                *[When(id=pid, then=Value(qty)) for pid, qty in quantities.items()],
+                default=Value(0),
+            )
+        )
+        sync_stock(quantities.keys())
+
+    @staticmethod
+    def touch(user):
+        """Push the expiry of every hold in the user's cart forward."""
+        StockReservation.objects.filter(user=user).update(
+            expires_at=timezone.now() + RESERVATION_TIMEOUT
+        )
+
+    @staticmethod
+    def reserve(user, product_id, quantity):
+        """
+        Take ``quantity`` units out of stock for the user's cart.
+        Returns ``False`` without touching anything when not enough stock is left.
+        """
+        with transaction.atomic():
+            taken = (
+                Product.objects
+                .filter(pk=product_id, amount__gte=quantity)
+                .update(amount=F('amount') - quantity)
+            )
+            if not taken:
+                return False
+            sync_stock([product_id])
+
+            expires_at = timezone.now() + RESERVATION_TIMEOUT
+            updated = (
+                StockReservation.objects
+                .filter(user=user, product_id=product_id)
+                .update(quantity=F('quantity') + quantity, expires_at=expires_at)
+            )
+            if not updated:
+                try:
+                    with transaction.atomic():
+                        StockReservation.objects.create(
+                            user=user, product_id=product_id,
+                            quantity=quantity, expires_at=expires_at,
+                        )
+                except IntegrityError:
+                    # A concurrent request created the row first.
+                    StockReservation.objects.filter(user=user, product_id=product_id).update(
+                        quantity=F('quantity') + quantity, expires_at=expires_at
+                    )
+        ReservationService.touch(user)
+        return True
+
+    @staticmethod
+    def release(user, product_id, quantity):
+        """Give back up to ``quantity`` held units; returns how many were released."""
+        with transaction.atomic():
+            reservation = (
+                StockReservation.objects
+                .select_for_update()
+                .filter(user=user, product_id=product_id)
+                .first()
+            )
+            if reservation is None:
+                return 0
+
+            released = min(quantity, reservation.quantity)
+            if released == reservation.quantity:
+                reservation.delete()
+            else:
+                reservation.quantity -= released
+                reservation.save(update_fields=['quantity', 'updated_at'])
+            ReservationService._return_stock({product_id: released})
+        ReservationService.touch(user)
+        return released
+
+    @staticmethod
+    def apply(user, deltas):
+        """
+        Apply ``{product_id: delta}`` to the user's holds in one transaction.
+        Positive deltas are taken from stock, negative ones are given back.
+        Returns the ids that lack stock; in that case nothing is changed.
+        """
+        wanted = {pid: delta for pid, delta in deltas.items() if delta > 0}
+        returned = {pid: -delta for pid, delta in deltas.items() if delta < 0}
+        expires_at = timezone.now() + RESERVATION_TIMEOUT
+
+        with transaction.atomic():
+            if wanted:
+                available = dict(
+                    Product.objects.select_for_update()
+                    .filter(id__in=wanted.keys())
+                    .values_list('id', 'amount')
+                )
+                short = [pid for pid, qty in wanted.items() if available.get(pid, 0) < qty]
+                if short:
+                    return short
+                Product.objects.filter(id__in=wanted.keys()).update(
+                    amount=F('amount') - Case(
+                        *[When(id=pid, then=Value(qty)) for pid, qty in wanted.items()],
+                        default=Value(0),
+                    )
+                )
+                sync_stock(wanted.keys())
+
+            existing = {
+                reservation.product_id: reservation
+                for reservation in StockReservation.objects.select_for_update().filter(
+                    user=user, product_id__in=deltas.keys()
+                )
+            }
+            to_create, to_update, to_delete = [], [], []
+            for pid, delta in deltas.items():
+                reservation = existing.get(pid)
+                if reservation is None:
+                    if delta > 0:
+                        to_create.append(StockReservation(
+                            user=user, product_id=pid, quantity=delta, expires_at=expires_at,
+                        ))
+                    continue
+                # Never hand back more than the cart actually held.
+                if delta < 0:
+                    returned[pid] = min(-delta, reservation.quantity)
+                reservation.quantity = max(reservation.quantity + delta, 0)
+                if reservation.quantity:
+                    to_update.append(reservation)
+                else:
+                    to_delete.append(reservation.id)
+            for pid in returned.keys() - existing.keys():
+                returned[pid] = 0
+
+            StockReservation.objects.bulk_create(to_create)
+            StockReservation.objects.bulk_update(to_update, ['quantity'])
+            StockReservation.objects.filter(id__in=to_delete).delete()
+            ReservationService._return_stock(returned)
+            ReservationService.touch(user)
+        return []
+
+    @staticmethod
+    def release_all(user):
+        """Return every hold of the user's cart to stock."""
+        with transaction.atomic():
+            reservations = StockReservation.objects.select_for_update().filter(user=user)
+            quantities = dict(reservations.values_list('product_id', 'quantity'))
+            ReservationService._return_stock(quantities)
+            reservations.delete()
+        return quantities
+
+    @staticmethod
+    def commit(user):
+        """Turn the user's holds into sold stock; the amounts stay decremented."""
+        with transaction.atomic():
+            reservations = StockReservation.objects.select_for_update().filter(user=user)
+            quantities = dict(reservations.values_list('product_id', 'quantity'))
+            reservations.delete()
+        return quantities
+
+    @staticmethod
+    def checkout(user, quantities):
+        """
+        Sell ``{product_id: quantity}`` out of the user's holds.
+        Quantity no longer held (the hold expired) is taken from stock now and
+        holds the order doesn't use go back to stock.
+        Returns the ids that lack stock; in that case nothing is changed.
+        """
+        with transaction.atomic():
+            reservations = StockReservation.objects.select_for_update().filter(user=user)
+            held = dict(reservations.values_list('product_id', 'quantity'))
+            missing = {
+                pid: qty - held.get(pid, 0)
+                for pid, qty in quantities.items() if qty > held.get(pid, 0)
+            }
+            surplus = {
+                pid: qty - quantities.get(pid, 0)
+                for pid, qty in held.items() if qty > quantities.get(pid, 0)
+            }
+
+            if missing:
+                available = dict(
+                    Product.objects.select_for_update()
+                    .filter(id__in=missing.keys())
+                    .values_list('id', 'amount')
+                )
+                short = [pid for pid, qty in missing.items() if available.get(pid, 0) < qty]
+                if short:
+                    return short
+                Product.objects.filter(id__in=missing.keys()).update(
+                    amount=F('amount') - Case(
+                        *[When(id=pid, then=Value(qty)) for pid, qty in missing.items()],
+                        default=Value(0),
+                    )
+                )
+                sync_stock(missing.keys())
+
+            ReservationService._return_stock(surplus)
+            reservations.delete()
+        return []
+
+    @staticmethod
+    def release_expired(batch_size=500):
+        """
+        Return stock held by abandoned carts.
+        Returns the ids of the users whose holds were released.
+        """
+        user_ids = set()
+        while True:
+            with transaction.atomic():
+                expired = list(
+                    StockReservation.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(expires_at__lte=timezone.now())
+                    .values_list('id', 'user_id', 'product_id', 'quantity')[:batch_size]
+                )
+                if not expired:
+                    break
+
+                quantities = {}
+                for _, user_id, product_id, quantity in expired:
+                    quantities[product_id] = quantities.get(product_id, 0) + quantity
+                    user_ids.add(user_id)
+                ReservationService._return_stock(quantities)
+                StockReservation.objects.filter(id__in=[row[0] for row in expired]).delete()
+        return user_ids
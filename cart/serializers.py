@@ -4,4 +4,42 @@ class CartItemSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1, default=1)
 
 class PaidOrderSerializer(serializers.Serializer):
-    is_paid = serializers.BooleanField(required=True)
\ No newline at end of file
+    is_paid = serializers.BooleanField(required=True)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    OP_ADD = 'add'
+    OP_UPDATE = 'update'
+    OP_REMOVE = 'remove'
+
+    op = serializers.ChoiceField(choices=[OP_ADD, OP_UPDATE, OP_REMOVE])
+    slug = serializers.SlugField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
+
+class CartLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(source='product_id')
+    name = serializers.CharField()
+    quantity = serializers.IntegerField()
+    unit_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class AppliedCouponSerializer(serializers.Serializer):
+    code = serializers.CharField()
+    discount = serializers.IntegerField()
+    product = serializers.IntegerField(source='product_id')
+    discounted_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+    amount_saved = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartSerializer(serializers.Serializer):
+    items = CartLineSerializer(many=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    coupon = AppliedCouponSerializer(allow_null=True)
+    total_cart_price = serializers.DecimalField(max_digits=12, decimal_places=2)
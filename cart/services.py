@@ -0,0 +1,305 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Optional
+from django_redis import get_redis_connection
+
+
+CACHE_TIMEOUT = 60 * 60 * 24 * 2  # 2 days
+
+
+# A cart is stored as two hashes per user:
+#   cart_<id>:lines   qty:<product_id>, price:<product_id> (cents), name:<product_id>
+#   cart_<id>:meta    subtotal (cents) and coupon_code/coupon_discount/coupon_product
+# Every script below takes KEYS = [lines, meta] and adjusts the subtotal in the
+# same call that changes a line, so reading the cart never has to recompute it.
+
+ADD_ITEM_SCRIPT = """
+local qty_field = 'qty:' .. ARGV[1]
+local price_field = 'price:' .. ARGV[1]
+local old_qty = tonumber(redis.call('HGET', KEYS[1], qty_field) or '0')
+local old_price = tonumber(redis.call('HGET', KEYS[1], price_field) or '0')
+local new_qty = old_qty + tonumber(ARGV[2])
+local price = tonumber(ARGV[3])
+redis.call('HSET', KEYS[1], qty_field, new_qty, price_field, price, 'name:' .. ARGV[1], ARGV[4])
+local subtotal = redis.call('HINCRBY', KEYS[2], 'subtotal', new_qty * price - old_qty * old_price)
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+redis.call('EXPIRE', KEYS[2], ARGV[5])
+return {new_qty, price, subtotal}
+"""
+
+REMOVE_ITEM_SCRIPT = """
+local qty_field = 'qty:' .. ARGV[1]
+local old_qty = redis.call('HGET', KEYS[1], qty_field)
+if not old_qty then
+    return false
+end
+old_qty = tonumber(old_qty)
+local price = tonumber(redis.call('HGET', KEYS[1], 'price:' .. ARGV[1]) or '0')
+redis.call('HDEL', KEYS[1], qty_field, 'price:' .. ARGV[1], 'name:' .. ARGV[1])
+local subtotal = redis.call('HINCRBY', KEYS[2], 'subtotal', -old_qty * price)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return {old_qty, price, subtotal}
+"""
+
+APPLY_COUPON_SCRIPT = """
+local qty = redis.call('HGET', KEYS[1], 'qty:' .. ARGV[3])
+if not qty then
+    return false
+end
+redis.call('HSET', KEYS[2], 'coupon_code', ARGV[1], 'coupon_discount', ARGV[2], 'coupon_product', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+local price = redis.call('HGET', KEYS[1], 'price:' .. ARGV[3])
+local subtotal = redis.call('HGET', KEYS[2], 'subtotal') or '0'
+return {tonumber(qty), tonumber(price), tonumber(subtotal)}
+"""
+
+# ARGV: ttl, then one (product_id, expected_qty, new_qty, unit_price, name)
+# group per line. Nothing is written unless every line still holds its expected
+# quantity, so a batch never clobbers a concurrent change.
+APPLY_LINES_SCRIPT = """
+local fields = 5
+local count = (#ARGV - 1) / fields
+for i = 0, count - 1 do
+    local base = 2 + i * fields
+    local current = tonumber(redis.call('HGET', KEYS[1], 'qty:' .. ARGV[base]) or '0')
+    if current ~= tonumber(ARGV[base + 1]) then
+        return false
+    end
+end
+local delta = 0
+for i = 0, count - 1 do
+    local base = 2 + i * fields
+    local product_id = ARGV[base]
+    local new_qty = tonumber(ARGV[base + 2])
+    local price = tonumber(ARGV[base + 3])
+    local old_qty = tonumber(redis.call('HGET', KEYS[1], 'qty:' .. product_id) or '0')
+    local old_price = tonumber(redis.call('HGET', KEYS[1], 'price:' .. product_id) or '0')
+    if new_qty == 0 then
+        redis.call('HDEL', KEYS[1], 'qty:' .. product_id, 'price:' .. product_id, 'name:' .. product_id)
+        delta = delta - old_qty * old_price
+    else
+        redis.call('HSET', KEYS[1], 'qty:' .. product_id, new_qty, 'price:' .. product_id, price, 'name:' .. product_id, ARGV[base + 4])
+        delta = delta + new_qty * price - old_qty * old_price
+    end
+end
+local subtotal = redis.call('HINCRBY', KEYS[2], 'subtotal', delta)
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+return {subtotal}
+"""
+
+
+def to_cents(amount):
+    return int((Decimal(amount) * 100).to_integral_value())
+
+
+def from_cents(cents):
+    return (Decimal(int(cents)) / 100).quantize(Decimal('0.01'))
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+@dataclass
+class CartLine:
+    product_id: int
+    name: str
+    quantity: int
+    unit_price: Decimal
+
+    @property
+    def total_price(self):
+        return self.unit_price * self.quantity
+
+
+@dataclass
+class AppliedCoupon:
+    code: str
+    discount: int
+    product_id: int
+    amount_saved: Decimal
+    discounted_price: Decimal
+
+    @classmethod
+    def build(cls, code, discount, product_id, line_total):
+        amount_saved = round(line_total * discount / 100, 2)
+        return cls(
+            code=code,
+            discount=discount,
+            product_id=product_id,
+            amount_saved=amount_saved,
+            discounted_price=round(line_total - amount_saved, 2),
+        )
+
+
+@dataclass
+class Cart:
+    lines: dict = field(default_factory=dict)
+    subtotal: Decimal = Decimal('0.00')
+    coupon: Optional[AppliedCoupon] = None
+
+    @property
+    def items(self):
+        return list(self.lines.values())
+
+    @property
+    def total_cart_price(self):
+        if self.coupon is None:
+            return self.subtotal
+        return round(self.subtotal - self.coupon.amount_saved, 2)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    @classmethod
+    def from_redis(cls, raw_lines, raw_meta):
+        fields = {}
+        for name, value in raw_lines.items():
+            kind, _, product_id = _decode(name).partition(':')
+            fields.setdefault(int(product_id), {})[kind] = _decode(value)
+
+        lines = {
+            product_id: CartLine(
+                product_id=product_id,
+                name=values.get('name', ''),
+                quantity=int(values['qty']),
+                unit_price=from_cents(values.get('price', 0)),
+            )
+            for product_id, values in fields.items()
+            if 'qty' in values
+        }
+
+        meta = {_decode(name): _decode(value) for name, value in raw_meta.items()}
+        cart = cls(lines=lines, subtotal=from_cents(meta.get('subtotal', 0)))
+        if 'coupon_code' in meta:
+            product_id = int(meta['coupon_product'])
+            line = lines.get(product_id)
+            cart.coupon = AppliedCoupon.build(
+                meta['coupon_code'],
+                int(meta['coupon_discount']),
+                product_id,
+                line.total_price if line else Decimal('0.00'),
+            )
+        return cart
+
+
+class CartService:
+    """Handles Redis hash operations for user carts."""
+
+    _scripts = {}
+
+    @staticmethod
+    def key_for(user_id):
+        return f"cart_{user_id}"
+
+    @staticmethod
+    def get_key(user):
+        return CartService.key_for(user.id)
+
+    @staticmethod
+    def keys_for(user_id):
+        key = CartService.key_for(user_id)
+        return [f"{key}:lines", f"{key}:meta"]
+
+    @staticmethod
+    def connection():
+        return get_redis_connection("default")
+
+    @classmethod
+    def _run(cls, name, source, user, args):
+        script = cls._scripts.get(name)
+        if script is None:
+            script = cls.connection().register_script(source)
+            cls._scripts[name] = script
+        return script(keys=cls.keys_for(user.id), args=args)
+
+    @staticmethod
+    def get_cart(user):
+        """Read the whole cart document in a single round trip; never writes."""
+        lines_key, meta_key = CartService.keys_for(user.id)
+        pipe = CartService.connection().pipeline(transaction=False)
+        pipe.hgetall(lines_key)
+        pipe.hgetall(meta_key)
+        raw_lines, raw_meta = pipe.execute()
+        return Cart.from_redis(raw_lines, raw_meta)
+
+    @staticmethod
+    def get_quantities(user, product_ids):
+        """Return ``{product_id: quantity}`` for the given lines in one HMGET; missing lines are 0."""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        lines_key, _ = CartService.keys_for(user.id)
+        values = CartService.connection().hmget(lines_key, [f"qty:{pid}" for pid in product_ids])
+        return {pid: int(value or 0) for pid, value in zip(product_ids, values)}
+
+    @classmethod
+    def add_item(cls, user, product, quantity):
+        """Atomically add ``quantity`` of ``product``; returns the updated line and subtotal."""
+        new_qty, price, subtotal = cls._run(
+            'add', ADD_ITEM_SCRIPT, user,
+            [product.id, quantity, to_cents(product.price), product.name, CACHE_TIMEOUT],
+        )
+        line = CartLine(product_id=product.id, name=product.name, quantity=int(new_qty), unit_price=from_cents(price))
+        return line, from_cents(subtotal)
+
+    @classmethod
+    def remove_item(cls, user, product_id):
+        """Atomically drop a line; returns the removed quantity or ``None`` if absent."""
+        result = cls._run('remove', REMOVE_ITEM_SCRIPT, user, [product_id, CACHE_TIMEOUT])
+        if not result:
+            return None, None
+        old_qty, _, subtotal = result
+        return int(old_qty), from_cents(subtotal)
+
+    @classmethod
+    def apply_lines(cls, user, changes):
+        """
+        Write several lines in one round trip.
+        ``changes`` is a list of ``(product, expected_quantity, new_quantity)``; a new
+        quantity of 0 drops the line. Returns the new subtotal, or ``None`` when a line
+        no longer holds its expected quantity and nothing was written.
+        """
+        args = [CACHE_TIMEOUT]
+        for product, expected, quantity in changes:
+            args.extend([product.id, expected, quantity, to_cents(product.price), product.name])
+        result = cls._run('apply_lines', APPLY_LINES_SCRIPT, user, args)
+        if not result:
+            return None
+        return from_cents(result[0])
+
+    @classmethod
+    def set_coupon(cls, user, coupon):
+        """Attach ``coupon`` to the cart; returns ``(applied, total)`` or ``None`` if its product is not in the cart."""
+        result = cls._run(
+            'apply_coupon', APPLY_COUPON_SCRIPT, user,
+            [coupon.code, coupon.discount, coupon.product_id, CACHE_TIMEOUT],
+        )
+        if not result:
+            return None
+        qty, price, subtotal = result
+        applied = AppliedCoupon.build(coupon.code, coupon.discount, coupon.product_id, from_cents(qty * price))
+        return applied, round(from_cents(subtotal) - applied.amount_saved, 2)
+
+    @staticmethod
+    def remove_coupon(user):
+        """Drop the applied coupon; returns ``False`` when none was applied."""
+        _, meta_key = CartService.keys_for(user.id)
+        pipe = CartService.connection().pipeline()
+        pipe.hdel(meta_key, 'coupon_code', 'coupon_discount', 'coupon_product')
+        pipe.hget(meta_key, 'subtotal')
+        removed, subtotal = pipe.execute()
+        return bool(removed), from_cents(subtotal or 0)
+
+    @staticmethod
+    def clear_cart(user):
+        CartService.connection().delete(*CartService.keys_for(user.id))
+
+    @staticmethod
+    def clear_carts(user_ids):
+        keys = [key for user_id in user_ids for key in CartService.keys_for(user_id)]
+        if keys:
+            CartService.connection().delete(*keys)
@@ -0,0 +1,12 @@
+from celery import shared_task
+from .reservations import ReservationService
+from .services import CartService
+
+
+@shared_task
+def release_expired_reservations():
+    """Return stock held by carts that were abandoned past their expiry."""
+    user_ids = ReservationService.release_expired()
+    # The lines are worthless without their holds, drop whatever is left of those carts.
+    CartService.clear_carts(user_ids)
+    return len(user_ids)
@@ -1,3 +1,157 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from product.models import Product
+from .models import StockReservation
+from .reservations import ReservationService
+from .services import CartService
+from .tasks import release_expired_reservations
 
-# Create your tests here.
+
+User = get_user_model()
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReservationServiceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Creating a user emails an OTP through an external API.
+        with mock.patch('account.signals.send_email_task'):
+            merchant = User.objects.create_user(
+                email='merchant@example.com', password='pass', roles=User.Roles.MERCHANT,
+            )
+            cls.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        cls.product = Product.objects.create(
+            merchant=merchant.merchant_profile, name='Lamp', price=5, amount=3,
+        )
+
+    def amount(self):
+        self.product.refresh_from_db()
+        return self.product.amount
+
+    def held(self):
+        reservation = StockReservation.objects.filter(user=self.customer, product=self.product).first()
+        return reservation.quantity if reservation else 0
+
+    def test_reserve_fails_when_stock_is_short(self):
+        self.assertTrue(ReservationService.reserve(self.customer, self.product.id, 2))
+        self.assertFalse(ReservationService.reserve(self.customer, self.product.id, 2))
+        self.assertEqual(self.amount(), 1)
+        self.assertEqual(self.held(), 2)
+
+    def test_apply_changes_nothing_when_stock_is_short(self):
+        short = ReservationService.apply(self.customer, {self.product.id: 4})
+        self.assertEqual(short, [self.product.id])
+        self.assertEqual(self.amount(), 3)
+        self.assertEqual(self.held(), 0)
+
+    def test_release_is_capped_at_the_quantity_held(self):
+        ReservationService.reserve(self.customer, self.product.id, 2)
+        self.assertEqual(ReservationService.release(self.customer, self.product.id, 5), 2)
+        self.assertEqual(self.amount(), 3)
+        self.assertEqual(self.held(), 0)
+        self.assertEqual(ReservationService.release(self.customer, self.product.id, 1), 0)
+        self.assertEqual(self.amount(), 3)
+
+    def test_expired_holds_return_stock_and_clear_the_cart(self):
+        ReservationService.reserve(self.customer, self.product.id, 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        with mock.patch.object(CartService, 'connection') as connection:
+            self.assertEqual(release_expired_reservations(), 1)
+        connection.return_value.delete.assert_called_once_with(*CartService.keys_for(self.customer.id))
+        self.assertEqual(self.amount(), 3)
+        self.assertEqual(self.held(), 0)
+
+    def test_unexpired_holds_are_kept(self):
+        ReservationService.reserve(self.customer, self.product.id, 2)
+        self.assertEqual(ReservationService.release_expired(), set())
+        self.assertEqual(self.held(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CartBatchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('account.signals.send_email_task'):
+            merchant = User.objects.create_user(
+                email='merchant@example.com', password='pass', roles=User.Roles.MERCHANT,
+            )
+            cls.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        cls.lamp = Product.objects.create(merchant=merchant.merchant_profile, name='Lamp', price=5, amount=3)
+        cls.desk = Product.objects.create(merchant=merchant.merchant_profile, name='Desk', price=40, amount=2)
+        # Two lamps are already in the cart and held for it.
+        StockReservation.objects.create(
+            user=cls.customer, product=cls.lamp, quantity=2,
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.customer)
+        self.apply_lines = self.patch('cart.views.CartService.apply_lines', return_value=Decimal('80.00'))
+        self.patch(
+            'cart.views.CartService.get_quantities',
+            side_effect=lambda user, ids: {pid: 2 if pid == self.lamp.id else 0 for pid in ids},
+        )
+        self.patch('cart.views.log_user_actions')
+
+    def patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def batch(self, *operations):
+        operations = [dict(zip(('op', 'slug', 'quantity'), operation)) for operation in operations]
+        return self.client.post(reverse('cart:cart-batch'), {'operations': operations}, format='json')
+
+    def stock(self):
+        return (
+            dict(Product.objects.values_list('slug', 'amount')),
+            dict(StockReservation.objects.values_list('product__slug', 'quantity')),
+        )
+
+    def test_operations_apply_in_order(self):
+        response = self.batch(
+            ('add', self.desk.slug, 1),
+            ('update', self.lamp.slug, 3),
+            ('add', self.desk.slug, 1),
+            ('remove', self.lamp.slug),
+        )
+        self.assertEqual(response.status_code, 200)
+        quantities = {item['product']: item['quantity'] for item in response.data['items']}
+        self.assertEqual(quantities, {self.lamp.id: 0, self.desk.id: 2})
+        changes = sorted((product.id, expected, new) for product, expected, new in self.apply_lines.call_args.args[1])
+        self.assertEqual(changes, sorted([(self.lamp.id, 2, 0), (self.desk.id, 0, 2)]))
+        self.assertEqual(self.stock(), ({self.lamp.slug: 5, self.desk.slug: 0}, {self.desk.slug: 2}))
+
+    def test_update_or_remove_of_a_missing_line(self):
+        for op in ('update', 'remove'):
+            response = self.batch(('add', self.lamp.slug, 1), (op, self.desk.slug, 1))
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.data['slug'], self.desk.slug)
+        response = self.batch(('remove', self.lamp.slug), ('update', self.lamp.slug, 1))
+        self.assertEqual(response.status_code, 404)
+        self.apply_lines.assert_not_called()
+        self.assertEqual(self.stock(), ({self.lamp.slug: 3, self.desk.slug: 2}, {self.lamp.slug: 2}))
+
+    def test_short_stock_rolls_back_the_batch(self):
+        response = self.batch(('update', self.lamp.slug, 4), ('add', self.desk.slug, 3))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['slugs'], [self.desk.slug])
+        self.apply_lines.assert_not_called()
+        self.assertEqual(self.stock(), ({self.lamp.slug: 3, self.desk.slug: 2}, {self.lamp.slug: 2}))
+
+    def test_concurrent_change_rolls_back_the_batch(self):
+        self.apply_lines.return_value = None
+        response = self.batch(('add', self.desk.slug, 2), ('remove', self.lamp.slug))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.stock(), ({self.lamp.slug: 3, self.desk.slug: 2}, {self.lamp.slug: 2}))
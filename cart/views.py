@@ -1,46 +1,23 @@
-from django.core.cache import cache
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.serializers import Serializer, IntegerField
 from product.models import Product
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.throttling import UserRateThrottle
-from .serializers import CartItemSerializer ,PaidOrderSerializer
-from recommendations.task import log_user_action
-from coupon.models import Coupon
+from django.db import transaction
+from .serializers import (
+    CartItemSerializer, PaidOrderSerializer, CartBatchSerializer, CartOperationSerializer,
+    CartSerializer, CartLineSerializer, AppliedCouponSerializer,
+)
+from .services import CartService
+from .reservations import ReservationService
+from recommendations.task import log_user_action, log_user_actions
+from coupon.utils import get_active_coupon
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
 
-CACHE_TIMEOUT = 60 * 60 * 24 * 2  # 2 days
-
-
-
-
-class CartService:
-    """Handles cache operations for user carts."""
-
-    @staticmethod
-    def get_key(user):
-        return f"cart_{user.id}"
-
-    @staticmethod
-    def get_cart(user):
-        return cache.get(CartService.get_key(user), {})
-
-    @staticmethod
-    def save_cart(user, cart):
-        cache.set(CartService.get_key(user), cart, timeout=CACHE_TIMEOUT)
-        return cart
-    
-    @staticmethod
-    def clear_cart(user):
-        key = CartService.get_key(user)
-        cache.delete(key)
-
-
 class CartViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
     throttle_classes = [UserRateThrottle]
@@ -51,10 +28,7 @@ class CartViewSet(viewsets.ViewSet):
         if not cart:
             return Response({'error': 'Cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        total_price = sum(item['total_price'] for item in cart.values())
-        cart['total_cart_price'] = total_price
-        CartService.save_cart(request.user, cart)
-        return Response({'cart': cart}, status=status.HTTP_200_OK)
+        return Response({'cart': CartSerializer(cart).data}, status=status.HTTP_200_OK)
 
     def create(self, request, slug=None):
         """Add a product to the cart."""
@@ -62,24 +36,14 @@ class CartViewSet(viewsets.ViewSet):
         serializer = CartItemSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         quantity = serializer.validated_data['quantity']
-        if product.amount < quantity:
+        if not ReservationService.reserve(request.user, product.id, quantity):
             return Response({'error':'the amount you want doesn\'t exist'},status=status.HTTP_404_NOT_FOUND)
-        
-        product.amount -= quantity
-        product.save()
 
-        cart = CartService.get_cart(request.user)
-        if product.id in cart:
-            cart[product.id]['quantity'] += quantity
-            cart[product.id]['total_price'] = product.price * cart[product.id]['quantity']
-        else:
-            cart[product.id] = {
-                'name': product.name,
-                'quantity': quantity,
-                'total_price': product.price * quantity,
-            }
-        cart[product.id]['total_price'] = product.price * cart[product.id]['quantity']
-        CartService.save_cart(request.user, cart)
+        try:
+            line, subtotal = CartService.add_item(request.user, product, quantity)
+        except Exception:
+            ReservationService.release(request.user, product.id, quantity)
+            raise
         
         
         try:
@@ -96,7 +60,11 @@ class CartViewSet(viewsets.ViewSet):
             pass
 
 
-        return Response({'message': 'Product added.', 'cart': cart}, status=status.HTTP_200_OK)
+        return Response({
+            'message': 'Product added.',
+            'item': CartLineSerializer(line).data,
+            'subtotal': subtotal,
+        }, status=status.HTTP_200_OK)
 
     def update(self, request, slug=None):
       """Update product quantity."""
@@ -105,26 +73,24 @@ class CartViewSet(viewsets.ViewSet):
       serializer.is_valid(raise_exception=True)
       quantity = serializer.validated_data['quantity']
 
-      cart = CartService.get_cart(request.user)
-      if product.id not in cart:
+      previous_amount = CartService.get_quantities(request.user, [product.id])[product.id]
+      if not previous_amount:
           return Response({'error': 'Product not found in cart.'}, status=status.HTTP_404_NOT_FOUND)
 
-      previous_amount = cart[product.id]['quantity']
-
-      if quantity > previous_amount:
-          diff = quantity - previous_amount
-          if product.amount < diff:
-              return Response({'error': 'Not enough stock available.'}, status=status.HTTP_400_BAD_REQUEST)
-          product.amount -= diff
-      else:
-          diff = previous_amount - quantity
-          product.amount += diff
+      # Stock is held before the line grows and given back only after it
+      # shrinks, so the cart never shows more than is held for it.
+      delta = quantity - previous_amount
+      if delta > 0 and not ReservationService.reserve(request.user, product.id, delta):
+          return Response({'error': 'Not enough stock available.'}, status=status.HTTP_400_BAD_REQUEST)
 
-      product.save()
+      # Only writes if the line still holds ``previous_amount``.
+      if CartService.apply_lines(request.user, [(product, previous_amount, quantity)]) is None:
+          if delta > 0:
+              ReservationService.release(request.user, product.id, delta)
+          return Response({'error': 'Cart changed, please retry.'}, status=status.HTTP_409_CONFLICT)
 
-      
-      cart[product.id]['quantity'] = quantity
-      CartService.save_cart(request.user, cart)  
+      if delta < 0:
+          ReservationService.release(request.user, product.id, -delta)
 
       return Response({'message': 'Cart updated successfully.'})
 
@@ -133,34 +99,106 @@ class CartViewSet(viewsets.ViewSet):
     def destroy(self, request, slug=None):
         """Remove a product from the cart."""
         product = get_object_or_404(Product, slug=slug)
-        cart = CartService.get_cart(request.user)
-        if product.id not in cart:
+        removed, subtotal = CartService.remove_item(request.user, product.id)
+        if removed is None:
             return Response({'error': 'Product not in cart.'}, status=status.HTTP_404_NOT_FOUND)
 
-        del cart[product.id]
-        CartService.save_cart(request.user, cart)
-        return Response({'message': 'Product removed.', 'cart': cart}, status=status.HTTP_200_OK)
+        ReservationService.release(request.user, product.id, removed)
+
+        return Response({'message': 'Product removed.', 'subtotal': subtotal}, status=status.HTTP_200_OK)
     
     @action(detail=False, methods=['delete'])
     def clear(self, request):
-        key = CartService.get_key(request.user)
-        cart = CartService.get_cart(request.user)
-        
         serializer = PaidOrderSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         is_paid = serializer.validated_data['is_paid']
     
-        if not is_paid and cart:
-            product_ids = cart.keys()
-            products = Product.objects.filter(id__in=product_ids)
-    
-            for product in products:
-                product.amount += cart[product.id]['quantity']
-            Product.objects.bulk_update(products, ['amount'])
+        if is_paid:
+            ReservationService.commit(request.user)
+        else:
+            ReservationService.release_all(request.user)
         
-        cache.delete(key)
+        CartService.clear_cart(request.user)
         return Response({'message': 'Cart cleared successfully.'})
 
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Apply a list of add/update/remove operations to the cart at once."""
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+
+        slugs = {operation['slug'] for operation in operations}
+        products = {
+            product.slug: product
+            for product in Product.objects.filter(slug__in=slugs).only('id', 'slug', 'name', 'price')
+        }
+        missing = sorted(slugs - products.keys())
+        if missing:
+            return Response({'error': 'Products not found.', 'slugs': missing}, status=status.HTTP_404_NOT_FOUND)
+
+        current = CartService.get_quantities(request.user, [product.id for product in products.values()])
+        quantities = dict(current)
+        added = {}
+        for operation in operations:
+            product = products[operation['slug']]
+            if operation['op'] == CartOperationSerializer.OP_ADD:
+                quantities[product.id] += operation['quantity']
+                added[product.id] = added.get(product.id, 0) + operation['quantity']
+            elif not quantities[product.id]:
+                return Response(
+                    {'error': 'Product not found in cart.', 'slug': product.slug},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            elif operation['op'] == CartOperationSerializer.OP_UPDATE:
+                quantities[product.id] = operation['quantity']
+            else:
+                quantities[product.id] = 0
+
+        deltas = {pid: quantities[pid] - current[pid] for pid in quantities if quantities[pid] != current[pid]}
+        changes = [
+            (product, current[product.id], quantities[product.id])
+            for product in products.values() if product.id in deltas
+        ]
+
+        with transaction.atomic():
+            short = ReservationService.apply(request.user, deltas)
+            if short:
+                return Response(
+                    {'error': 'Not enough stock available.', 'slugs': sorted(p.slug for p in products.values() if p.id in short)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            subtotal = CartService.apply_lines(request.user, changes) if changes else None
+            if changes and subtotal is None:
+                # The cart moved under us; roll the stock changes back.
+                transaction.set_rollback(True)
+                return Response({'error': 'Cart changed, please retry.'}, status=status.HTTP_409_CONFLICT)
+
+        if added:
+            try:
+                session_id = getattr(request.session, 'session_key', None)
+                log_user_actions.delay(events=[
+                    {
+                        'user_id': request.user.id,
+                        'product_id': product_id,
+                        'action': 'add_to_cart',
+                        'session_id': session_id,
+                        'metadata': {'quantity': quantity, 'source': 'cart_batch'},
+                    }
+                    for product_id, quantity in added.items()
+                ])
+            except Exception:
+                pass
+
+        return Response({
+            'message': 'Cart updated successfully.',
+            'items': [
+                {'product': product.id, 'name': product.name, 'quantity': quantities[product.id]}
+                for product in products.values()
+            ],
+            'subtotal': subtotal,
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['post'])
     def apply_coupon(self, request):
         """Apply a coupon to the user's cart."""
@@ -168,9 +206,8 @@ class CartViewSet(viewsets.ViewSet):
         if not code:
             return Response({'error': 'Coupon code is required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            coupon = Coupon.objects.get(code=code, active=True)
-        except Coupon.DoesNotExist:
+        coupon = get_active_coupon(code)
+        if coupon is None:
             return Response({'error': 'Invalid coupon code.'}, status=status.HTTP_404_NOT_FOUND)
         
             
@@ -178,49 +215,25 @@ class CartViewSet(viewsets.ViewSet):
         if not (coupon.valid_from <= now <= coupon.valid_to):
             raise ValidationError("This coupon is expired or not yet valid.")
 
-        cart = CartService.get_cart(request.user)
-        if not cart:
-            return Response({'error': 'Your cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
-
-        product_id = coupon.product.id
-        if product_id not in cart:
+        applied = CartService.set_coupon(request.user, coupon)
+        if applied is None:
             raise ValidationError("This coupon does not apply to any product in your cart.")
 
-        original_price = cart[product_id]['total_price']
-        discount = coupon.discount
-        discounted_price = original_price - (original_price * discount / 100)
-        difference = original_price - discounted_price
-
-        cart["coupon"] = {
-            "code": coupon.code,
-            "discount": discount,
-            "product": product_id,
-            "discounted_price": round(discounted_price, 2),
-            "amount_saved": round(difference, 2)
-        }
-
-        total_price = sum(item['total_price'] for key, item in cart.items() if isinstance(key, int))
-        cart['total_cart_price'] = round(total_price - difference, 2)
-
-        CartService.save_cart(request.user, cart)
+        coupon, total_price = applied
         return Response({
             "message": "Coupon applied successfully.",
-            "coupon": cart["coupon"],
-            "total_cart_price": cart["total_cart_price"]
+            "coupon": AppliedCouponSerializer(coupon).data,
+            "total_cart_price": total_price
         }, status=status.HTTP_200_OK)
 
 
     @action(detail=False, methods=['post'])
     def remove_coupon(self, request):
         """Remove any applied coupon from the cart."""
-        cart = CartService.get_cart(request.user)
-        if "coupon" not in cart:
+        removed, total_price = CartService.remove_coupon(request.user)
+        if not removed:
             return Response({'error': 'No coupon applied.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        del cart["coupon"]
-        total_price = sum(item['total_price'] for key, item in cart.items() if isinstance(key, int))
-        cart['total_cart_price'] = total_price
-        CartService.save_cart(request.user, cart)
         return Response({
             "message": "Coupon removed.",
             "total_cart_price": total_price
@@ -4,6 +4,8 @@ from django.apps import AppConfig
 class CouponConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'coupon'
+    def ready(self):
+        import coupon.signals
 
 
 
@@ -1,7 +1,7 @@
 from django.db import models
 from user_profile.models import CustomerProfile,MerchantProfile
 from product.models import Product
-import secrets
+from src.ids import new_id
 from django.core.validators import MinValueValidator , MaxValueValidator
 from django.utils import timezone
 from order.models import Order
@@ -17,11 +17,7 @@ class Referral(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.referral_code:
-            while True:
-                code = secrets.token_hex(4)
-                if not Referral.objects.filter(referral_code=code).exists():
-                    self.referral_code = code
-                    break
+            self.referral_code = new_id('referral')
         super().save(*args, **kwargs)
 
     def __str__(self):
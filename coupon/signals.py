@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import Coupon
+from .utils import invalidate_coupon
+
+
+@receiver(pre_save, sender=Coupon)
+def remember_previous_code(sender, instance, **kwargs):
+    instance._previous_code = None
+    if instance.pk:
+        instance._previous_code = (
+            Coupon.objects.filter(pk=instance.pk).values_list('code', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Coupon)
+def invalidate_cached_coupon(sender, instance, **kwargs):
+    invalidate_coupon(instance.code, getattr(instance, '_previous_code', None))
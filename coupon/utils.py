@@ -0,0 +1,25 @@
+from django.core.cache import cache
+from src.cache import local_get, invalidate_local
+from .models import Coupon
+
+
+COUPON_CACHE_TIMEOUT = 60 * 10
+
+
+def coupon_cache_key(code):
+    return f"coupon_{code}"
+
+
+def get_active_coupon(code):
+    """Return the active coupon for ``code`` or ``None``; misses are cached too."""
+    return local_get(
+        coupon_cache_key(code),
+        lambda: Coupon.objects.filter(code=code, active=True).first(),
+        timeout=COUPON_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_coupon(*codes):
+    keys = [coupon_cache_key(code) for code in codes if code]
+    cache.delete_many(keys)
+    invalidate_local(*keys)
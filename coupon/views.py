@@ -10,6 +10,7 @@ from rest_framework.exceptions import ValidationError
 from product.permissions import IsMerchant
 from product.models import Product
 from .serializers import CouponSerializer
+from .utils import get_active_coupon
 from rest_framework.generics import (
     CreateAPIView, ListAPIView, RetrieveAPIView, UpdateAPIView, DestroyAPIView
 )
@@ -99,9 +100,8 @@ class ApplyCouponAPIView(APIView):
             raise ValidationError("Product does not exist.")
 
  
-        try:
-            coupon = Coupon.objects.get(code=coupon_code, active=True)
-        except Coupon.DoesNotExist:
+        coupon = get_active_coupon(coupon_code)
+        if coupon is None:
             raise ValidationError("Invalid coupon code.")
 
  
@@ -110,7 +110,7 @@ class ApplyCouponAPIView(APIView):
             raise ValidationError("This coupon is expired or not yet valid.")
 
 
-        if coupon.product != product:
+        if coupon.product_id != product.id:
             raise ValidationError("This coupon is not valid for this product.")
 
 
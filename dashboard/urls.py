@@ -4,6 +4,9 @@ from .views import (
     MerchantPaidProductsView,
     MerchantCreateProductsView,
     MerchantUpdateProductsView,
+    MerchantImportProductsView,
+    MerchantExportProductsView,
+    MerchantBulkUpdateProductsView,
     MerchantChartDataView,
     GenerateReport,
 )
@@ -20,6 +23,15 @@ urlpatterns = [
     # Create a new product (for merchants)
     path('products/create/', MerchantCreateProductsView.as_view(), name='create-product'),
 
+    # Bulk import products from a CSV/NDJSON upload
+    path('products/import/', MerchantImportProductsView.as_view(), name='import-products'),
+
+    # Bulk update price/stock: [{slug, price, amount}, ...]
+    path('products/bulk-update/', MerchantBulkUpdateProductsView.as_view(), name='bulk-update-products'),
+
+    # Stream all of the merchant's products as CSV/NDJSON
+    path('products/export/<str:file_format>/', MerchantExportProductsView.as_view(), name='export-products'),
+
     # Update an existing product by its slug
     path('products/<slug:slug>/update/', MerchantUpdateProductsView.as_view(), name='update-product'),
 
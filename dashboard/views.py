@@ -1,17 +1,23 @@
 from rest_framework.generics import ListAPIView,CreateAPIView,UpdateAPIView
 from product.models import Product
-from product.serializers import ProductSerializer
+from product.serializers import ProductSerializer, ProductListSerializer
+from product.listing import listing_values
 from product.permissions import IsMerchant
+from product.search import ProductSearchFilter
+from src.pagination import ProductCursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.throttling import UserRateThrottle
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Sum
 from order.models import OrderItem
 from .serializers import DateSerializer
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import ValidationError
+from product import bulk
 import csv
 # PDF imports
 from reportlab.lib.pagesizes import A4
@@ -21,12 +27,14 @@ from django.utils import timezone
 
 
 class BaseMerchantProductsView(ListAPIView):
-    serializer_class = ProductSerializer
+    serializer_class = ProductListSerializer
     permission_classes = [IsAuthenticated, IsMerchant]
     throttle_classes = [UserRateThrottle]
-    filter_backends = [SearchFilter, OrderingFilter]
+    filter_backends = [ProductSearchFilter, OrderingFilter]
     search_fields = ['name', 'description']
-    ordering_fields = ['price', 'created_at']
+    # Ties (e.g. every unrated product) are paged by the (field, id) keyset.
+    ordering_fields = ['price', 'created_at', 'rating_avg']
+    pagination_class = ProductCursorPagination
     related_field = None  
 
     def get_queryset(self):
@@ -37,7 +45,7 @@ class BaseMerchantProductsView(ListAPIView):
             "merchant": merchant,
             f"{self.related_field}__isnull": False
         }
-        return Product.objects.filter(**filter_kwargs).distinct()
+        return listing_values(Product.objects.filter(**filter_kwargs).distinct())
 
 
 class MerchantOrderedProductsView(BaseMerchantProductsView):
@@ -57,6 +65,64 @@ class MerchantCreateProductsView(CreateAPIView):
         serializer.save(merchant=self.request.user.merchant_profile)
 
 
+class MerchantImportProductsView(APIView):
+    """
+    Bulk-create products from an uploaded CSV or NDJSON ``file``. The format
+    follows the file extension unless ``file_format`` is given.
+    """
+    permission_classes = [IsAuthenticated, IsMerchant]
+    throttle_classes = [UserRateThrottle]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': "This field is required."})
+        file_format = request.data.get('file_format') or bulk.detect_format(upload.name)
+        if file_format not in bulk.FORMATS:
+            raise ValidationError({'file_format': f"Must be one of: {', '.join(bulk.FORMATS)}."})
+
+        result = bulk.import_products(request.user.merchant_profile, upload, file_format)
+        response_status = status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST
+        return Response(result, status=response_status)
+
+
+class MerchantBulkUpdateProductsView(APIView):
+    """Update price and/or stock of many products: ``[{slug, price, amount}, ...]``."""
+    permission_classes = [IsAuthenticated, IsMerchant]
+    throttle_classes = [UserRateThrottle]
+
+    def post(self, request):
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            raise ValidationError("Expected a non-empty list of products.")
+        if len(rows) > bulk.MAX_UPDATE_ROWS:
+            raise ValidationError(f"At most {bulk.MAX_UPDATE_ROWS} products per request.")
+
+        results = bulk.update_products(request.user.merchant_profile, rows)
+        summary = {
+            outcome: sum(1 for result in results if result['status'] == outcome)
+            for outcome in (bulk.UPDATED, bulk.UNCHANGED, bulk.NOT_FOUND, bulk.INVALID)
+        }
+        return Response({'summary': summary, 'results': results}, status=status.HTTP_200_OK)
+
+
+class MerchantExportProductsView(APIView):
+    permission_classes = [IsAuthenticated, IsMerchant]
+    throttle_classes = [UserRateThrottle]
+
+    def get(self, request, file_format):
+        if file_format not in bulk.FORMATS:
+            return HttpResponse("Invalid export format.", status=400)
+        products = Product.objects.filter(merchant=request.user.merchant_profile)
+        response = StreamingHttpResponse(
+            bulk.export_products(products, file_format),
+            content_type=bulk.CONTENT_TYPES[file_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="products.{file_format}"'
+        return response
+
+
 class MerchantUpdateProductsView(UpdateAPIView):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated, IsMerchant]
@@ -77,7 +143,7 @@ class MerchantChartDataView(APIView):
             OrderItem.objects
             .filter(product__merchant=merchant)
             .values('order__created_at__date')
-            .annotate(total_sales=Sum('price'))
+            .annotate(total_sales=Sum('total'))
             .order_by('order__created_at__date')
         )
         labels = [item['order__created_at__date'] for item in data]
@@ -137,7 +203,7 @@ class GenerateReport(APIView):
                 item.product.name,
                 item.quantity,
                 item.price,
-                float(item.price) * item.quantity,
+                item.total,
                 item.order.created_at.strftime("%Y-%m-%d"),
             ])
         return response
@@ -168,10 +234,9 @@ class GenerateReport(APIView):
             if y < 50:  # add new page if full
                 p.showPage()
                 y = height - 50
-            total_price = float(item.price) * item.quantity
             p.drawString(50, y, f"{item.order.first_name} {item.order.last_name}")
             p.drawString(200, y, item.product.name)
-            p.drawString(350, y, f"{total_price:.2f}")
+            p.drawString(350, y, f"{item.total:.2f}")
             y -= 15
 
         p.showPage()
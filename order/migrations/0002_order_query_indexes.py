@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0001_initial'),
+        ('product', '0005_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product', 'order'], name='order_order_product_958ef8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatus',
+            index=models.Index(fields=['order', '-timestamp'], name='order_order_order_i_97598f_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:26
+
+import order.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0002_order_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='order_id',
+            field=models.CharField(default=order.models.generate_order_id, max_length=10, unique=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:27
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_current_status(apps, schema_editor):
+    Order = apps.get_model('order', 'Order')
+    OrderStatus = apps.get_model('order', 'OrderStatus')
+    latest = OrderStatus.objects.filter(order=OuterRef('pk')).order_by('-timestamp', '-id')
+    Order.objects.update(
+        current_status=Coalesce(Subquery(latest.values('status')[:1]), Value('Pending')),
+        status_changed_at=Coalesce(Subquery(latest.values('timestamp')[:1]), F('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0003_widen_order_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='current_status',
+            field=models.CharField(choices=[('Cancelled', 'cancelled'), ('Pending', 'pending'), ('Shipped', 'shipped'), ('Delivered', 'delivered')], default='Pending', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='status_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['current_status', 'status_changed_at'], name='order_order_current_3e67cc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderstatus',
+            index=models.Index(fields=['status', 'timestamp'], name='order_order_status_b3079a_idx'),
+        ),
+        migrations.RunPython(backfill_current_status, migrations.RunPython.noop),
+    ]
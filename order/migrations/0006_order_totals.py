@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:28
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    """``OrderItem.price`` used to hold the line total; turn it into the unit price."""
+    Order = apps.get_model('order', 'Order')
+    OrderItem = apps.get_model('order', 'OrderItem')
+    OrderItem.objects.update(total=F('price'))
+    OrderItem.objects.filter(quantity__gt=1).update(
+        price=ExpressionWrapper(F('total') / F('quantity'), output_field=DecimalField())
+    )
+    item_totals = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by().values('order').annotate(sum=Sum('total')).values('sum')
+    )
+    Order.objects.update(subtotal=Coalesce(Subquery(item_totals), Value(0), output_field=DecimalField()))
+    Order.objects.update(total=F('subtotal'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0005_order_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=10),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
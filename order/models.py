@@ -1,21 +1,26 @@
-from django.db import models
-import random
-import string
+from django.db import models, transaction
 from django.utils import timezone
 from product.models import Product
 from django.contrib.auth import get_user_model
+from src.ids import ID_LENGTH, new_id
 
 User = get_user_model()
 
 
-def generate_order_id(length=8):
-     characters = string.ascii_letters + string.digits
-     return ''.join(random.choices(characters,k=length))
+def generate_order_id():
+     return new_id('order')
+
+
+class Status(models.TextChoices):
+     CANCELLED = 'Cancelled','cancelled'
+     Pending = 'Pending','pending'
+     SHIPPED = 'Shipped','shipped'
+     DELIVERED = 'Delivered','delivered'
 
 
 class Order(models.Model):
      user = models.ForeignKey(User,on_delete=models.CASCADE,related_name='order')
-     order_id = models.CharField(max_length = 8 , default = generate_order_id,unique=True)
+     order_id = models.CharField(max_length = ID_LENGTH , default = generate_order_id,unique=True)
      first_name = models.CharField(max_length = 30)
      last_name = models.CharField(max_length = 30)
      city = models.CharField(max_length = 30)
@@ -25,11 +30,25 @@ class Order(models.Model):
      update_at = models.DateTimeField(auto_now_add = True)
      paid = models.BooleanField(default=False)
      postal_code = models.PositiveIntegerField()
+     # Written once at checkout from the cart; total = subtotal - discount.
+     subtotal = models.DecimalField(max_digits=12,decimal_places=2,default=0)
+     discount = models.DecimalField(max_digits=12,decimal_places=2,default=0)
+     total = models.DecimalField(max_digits=12,decimal_places=2,default=0)
+     # Copy of the latest OrderStatus, kept in step by OrderStatus.save.
+     current_status = models.CharField(max_length=30,choices=Status.choices,default=Status.Pending)
+     status_changed_at = models.DateTimeField(default=timezone.now)
+     # Set by the email tasks, so a redelivered task doesn't email twice.
+     confirmation_sent_at = models.DateTimeField(null=True,blank=True)
+     invoice_sent_at = models.DateTimeField(null=True,blank=True)
 
      class Meta:
           ordering = ['-created_at']
           indexes = [
-               models.Index(fields=['created_at'])
+               models.Index(fields=['created_at']),
+               # A customer's order history, newest first (keyset pagination).
+               models.Index(fields=['user', '-created_at', '-id']),
+               # "Orders currently shipped since X".
+               models.Index(fields=['current_status', 'status_changed_at']),
           ]
      
      def __str__(self):
@@ -37,18 +56,14 @@ class Order(models.Model):
      
      def save(self,*args,**kwargs):
           if not self.order_id:
-               unique_id = generate_order_id()
-               while Order.objects.filter(order_id = unique_id).exists():
-                    unique_id = generate_order_id()
-               self.order_id = unique_id
+               self.order_id = generate_order_id()
           super().save(*args,**kwargs)
 
      def get_products(self):
          return [item.product for item in self.order_item.all()]
      
      def get_status(self):
-         latest_status = self.order_status.order_by('-timestamp').first()
-         return latest_status.status if latest_status else None
+         return self.current_status
 
 
 
@@ -57,21 +72,51 @@ class Order(models.Model):
 class OrderItem(models.Model):
      order = models.ForeignKey(Order,on_delete=models.CASCADE,related_name='order_item')
      product = models.ForeignKey(Product,on_delete=models.CASCADE,related_name='order_item')
-     price = models.DecimalField(max_digits=6,decimal_places=2)
+     # Unit price at checkout; total = price * quantity - discount.
+     price = models.DecimalField(max_digits=10,decimal_places=2)
      quantity = models.PositiveIntegerField(default=1)
+     discount = models.DecimalField(max_digits=12,decimal_places=2,default=0)
+     total = models.DecimalField(max_digits=12,decimal_places=2,default=0)
      created_at = models.DateField(auto_now_add=True)
 
+     class Meta:
+          indexes = [
+               # Merchant dashboards go product -> items -> orders.
+               models.Index(fields=['product', 'order']),
+          ]
+
 
 class OrderStatus(models.Model):
-     class Status(models.TextChoices):
-          CANCELLED = 'Cancelled','cancelled'
-          Pending = 'Pending','pending'
-          SHIPPED = 'Shipped','shipped'
-          DELIVERED = 'Delivered','delivered'
+     Status = Status
 
      order = models.ForeignKey(Order,on_delete=models.CASCADE,related_name='order_status')
      status = models.CharField(max_length=30,choices=Status.choices,default=Status.Pending)
      timestamp = models.DateTimeField(auto_now_add=True)
+
+     class Meta:
+          indexes = [
+               # History of one order, newest first.
+               models.Index(fields=['order', '-timestamp']),
+               # "Orders that were shipped since X".
+               models.Index(fields=['status', 'timestamp']),
+          ]
+
+     def save(self,*args,**kwargs):
+          created = self._state.adding
+          with transaction.atomic():
+               super().save(*args,**kwargs)
+               if created:
+                    self.apply_to_order()
+
+     def apply_to_order(self):
+          """Make this the order's current status unless a newer one exists."""
+          updated = Order.objects.filter(pk=self.order_id,status_changed_at__lte=self.timestamp).update(
+               current_status=self.status,status_changed_at=self.timestamp
+          )
+          order = self._state.fields_cache.get('order')
+          if updated and order is not None:
+               order.current_status = self.status
+               order.status_changed_at = self.timestamp
      
 
 class OrderPayment(models.Model):
@@ -80,3 +125,29 @@ class OrderPayment(models.Model):
      phone_number = models.CharField(max_length=30)
 
      
+
+
+class OutboxEvent(models.Model):
+     """
+     A Celery task call recorded in the transaction that caused it; see
+     order.outbox. Delivered by the relay task once committed.
+     """
+     task = models.CharField(max_length=200)
+     args = models.JSONField(default=list)
+     kwargs = models.JSONField(default=dict)
+     # Publishing the same key twice keeps the first event only.
+     dedup_key = models.CharField(max_length=200,unique=True,null=True,blank=True)
+     created_at = models.DateTimeField(auto_now_add=True)
+     sent_at = models.DateTimeField(null=True,blank=True)
+     attempts = models.PositiveIntegerField(default=0)
+     last_error = models.TextField(blank=True)
+
+     class Meta:
+          indexes = [
+               # Only undelivered events are ever scanned by the relay.
+               models.Index(fields=['id'],condition=models.Q(sent_at__isnull=True),name='order_outbox_pending_idx'),
+               models.Index(fields=['sent_at']),
+          ]
+
+     def __str__(self):
+          return f"{self.task} #{self.pk}"
@@ -0,0 +1,86 @@
+"""
+Transactional outbox for order side effects.
+
+Views don't call ``.delay()`` while handling a request: they ``publish``
+the task calls as ``OutboxEvent`` rows in the same transaction as the order,
+which costs one INSERT and nothing at all if the transaction rolls back.
+``relay`` (run by Celery beat every few seconds) sends pending events to the
+broker in batches and marks them sent; when the broker is down the events
+simply stay pending until the next run.
+
+Delivery is at least once: a crash between sending and marking an event
+sent resends it, so the tasks themselves must tolerate running twice (the
+order emails stamp ``Order.confirmation_sent_at``/``invoice_sent_at``).
+Events published with the same ``dedup_key`` are only stored once.
+"""
+import logging
+from datetime import timedelta
+from celery import current_app
+from django.db import transaction
+from django.utils import timezone
+from .models import OutboxEvent
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+RETENTION = timedelta(days=7)
+
+
+def event(task, *args, dedup_key=None, **kwargs):
+    """Build (without saving) a call of the Celery task named ``task``."""
+    return OutboxEvent(task=task, args=list(args), kwargs=kwargs, dedup_key=dedup_key)
+
+
+def publish(*events):
+    """Store ``events`` in the current transaction with a single INSERT."""
+    if events:
+        OutboxEvent.objects.bulk_create(events, ignore_conflicts=True)
+
+
+def relay(batch_size=BATCH_SIZE):
+    """Send pending events to the broker; returns how many were sent."""
+    sent = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                OutboxEvent.objects
+                .select_for_update(skip_locked=True)
+                .filter(sent_at__isnull=True)
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            delivered = []
+            failed = None
+            for outbox_event in batch:
+                try:
+                    current_app.send_task(
+                        outbox_event.task,
+                        args=outbox_event.args,
+                        kwargs=outbox_event.kwargs,
+                        task_id=f'outbox-{outbox_event.pk}',
+                    )
+                except Exception as e:
+                    # The broker is most likely down; retry on the next run.
+                    logger.warning(f"Outbox relay failed for {outbox_event}: {e}")
+                    outbox_event.attempts += 1
+                    outbox_event.last_error = str(e)
+                    failed = outbox_event
+                    break
+                delivered.append(outbox_event.pk)
+
+            OutboxEvent.objects.filter(pk__in=delivered).update(sent_at=timezone.now())
+            if failed is not None:
+                failed.save(update_fields=['attempts', 'last_error'])
+        sent += len(delivered)
+        if failed is not None or len(batch) < batch_size:
+            break
+    return sent
+
+
+def purge(retention=RETENTION):
+    """Delete events delivered more than ``retention`` ago."""
+    deleted, _ = OutboxEvent.objects.filter(sent_at__lt=timezone.now() - retention).delete()
+    return deleted
@@ -1,11 +1,37 @@
 from rest_framework import serializers
-from .models import Order , OrderStatus , OrderPayment
+from .models import Order , OrderItem , OrderStatus , OrderPayment
 import re
 
 class OrderSerializer(serializers.ModelSerializer):
      class Meta:
           model = Order
-          fields = ['first_name','last_name','city','address','email','created_at','update_at','paid','postal_code']
+          fields = ['first_name','last_name','city','address','email','created_at','update_at','paid','postal_code','current_status','status_changed_at','subtotal','discount','total']
+          read_only_fields = ['current_status','status_changed_at','subtotal','discount','total']
+
+
+class OrderHistoryItemSerializer(serializers.ModelSerializer):
+     product_name = serializers.CharField(source='product.name')
+     product_slug = serializers.CharField(source='product.slug')
+
+     class Meta:
+          model = OrderItem
+          fields = ['product','product_name','product_slug','quantity','price','discount','total']
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+     """One order of the history without its items; ``item_count`` is annotated."""
+     item_count = serializers.IntegerField()
+
+     class Meta:
+          model = Order
+          fields = ['order_id','created_at','paid','current_status','status_changed_at','item_count','subtotal','discount','total']
+
+
+class OrderHistorySerializer(OrderSummarySerializer):
+     items = OrderHistoryItemSerializer(source='order_item',many=True)
+
+     class Meta(OrderSummarySerializer.Meta):
+          fields = OrderSummarySerializer.Meta.fields + ['items']
 
 
 class OrderStatusSerializer(serializers.ModelSerializer):
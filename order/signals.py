@@ -6,6 +6,8 @@ from .models import Order,OrderStatus
 @receiver(post_save,sender=Order)
 def order_status(sender, instance, created, **kwargs):
      if created:
-          OrderStatus.objects.create(order=instance)
+          # The order already starts out Pending; bulk_create skips the
+          # Order update OrderStatus.save would add.
+          OrderStatus.objects.bulk_create([OrderStatus(order=instance,status=instance.current_status)])
 
 
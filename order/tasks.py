@@ -1,5 +1,8 @@
+from contextlib import contextmanager
 from celery import shared_task
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from django.template.loader import render_to_string
 from django.shortcuts import get_object_or_404
 from .models import Order
@@ -9,6 +12,25 @@ from reportlab.pdfgen import canvas
 from io import BytesIO
 
 BREVO_API_URL = "https://api.brevo.com/v3/smtp/email"
+EMAIL_LOCK_TIMEOUT = 60 * 5
+
+
+@contextmanager
+def _send_once(order, field):
+    """
+    Yield whether the email stamped in ``field`` still has to go out and
+    stamp it when the block succeeds. Tasks arrive at least once (see
+    order.outbox), so redelivered or concurrent copies must not resend.
+    """
+    lock = f'order_email:{field}:{order.pk}'
+    if getattr(order, field) or not cache.add(lock, 1, timeout=EMAIL_LOCK_TIMEOUT):
+        yield False
+        return
+    try:
+        yield True
+        Order.objects.filter(pk=order.pk).update(**{field: timezone.now()})
+    finally:
+        cache.delete(lock)
 
 
 def send_via_brevo(subject, html_content, to_email, attachments=None):
@@ -41,10 +63,13 @@ def send_order_confirmation(self, order_id):
     """Send a confirmation email asynchronously."""
     try:
         order = get_object_or_404(Order, order_id=order_id)
-        subject = "🛒 Order Confirmed!"
-        html_content = render_to_string("emails/order_confirmation.html", {"order": order})
+        with _send_once(order, 'confirmation_sent_at') as pending:
+            if not pending:
+                return f"Confirmation for {order.order_id} already sent"
+            subject = "🛒 Order Confirmed!"
+            html_content = render_to_string("emails/order_confirmation.html", {"order": order})
 
-        send_via_brevo(subject, html_content, order.user.email)
+            send_via_brevo(subject, html_content, order.user.email)
 
         return f"Email sent successfully to {order.user.email}"
 
@@ -58,36 +83,56 @@ def send_invoice_email(self, order_id):
     try:
         order = get_object_or_404(Order, order_id=order_id)
 
-        # Create a PDF using ReportLab
-        pdf_buffer = BytesIO()
-        p = canvas.Canvas(pdf_buffer, pagesize=A4)
-        p.setFont("Helvetica", 12)
-
-        p.drawString(100, 800, f"Invoice for Order #{order.order_id}")
-        p.drawString(100, 780, f"Customer: {order.first_name} {order.last_name}")
-        p.drawString(100, 760, f"Email: {order.user.email}")
-
-        p.drawString(100, 700, "Thank you for shopping with us!")
-        p.showPage()
-        p.save()
-
-        pdf_buffer.seek(0)
-        pdf_bytes = pdf_buffer.getvalue()
-
-        subject = f"📦 Your Order Invoice — {order.order_id}"
-        html_content = render_to_string("emails/invoice_email.html", {"order": order})
+        with _send_once(order, 'invoice_sent_at') as pending:
+            if not pending:
+                return f"Invoice for {order.order_id} already sent"
+            # Create a PDF using ReportLab
+            pdf_buffer = BytesIO()
+            p = canvas.Canvas(pdf_buffer, pagesize=A4)
+            p.setFont("Helvetica", 12)
+
+            p.drawString(100, 800, f"Invoice for Order #{order.order_id}")
+            p.drawString(100, 780, f"Customer: {order.first_name} {order.last_name}")
+            p.drawString(100, 760, f"Email: {order.user.email}")
+            p.drawString(100, 740, f"Subtotal: {order.subtotal:.2f}")
+            p.drawString(100, 725, f"Discount: {order.discount:.2f}")
+            p.drawString(100, 710, f"Total: {order.total:.2f}")
+
+            p.drawString(100, 680, "Thank you for shopping with us!")
+            p.showPage()
+            p.save()
+
+            pdf_buffer.seek(0)
+            pdf_bytes = pdf_buffer.getvalue()
+
+            subject = f"📦 Your Order Invoice — {order.order_id}"
+            html_content = render_to_string("emails/invoice_email.html", {"order": order})
+
+            attachments = [
+                {
+                    "name": f"invoice_{order.order_id}.pdf",
+                    "content": pdf_bytes.decode("latin1"),
+                    "type": "application/pdf",
+                }
+            ]
+
+            send_via_brevo(subject, html_content, order.user.email, attachments)
 
-        attachments = [
-            {
-                "name": f"invoice_{order.order_id}.pdf",
-                "content": pdf_bytes.decode("latin1"),
-                "type": "application/pdf",
-            }
-        ]
-
-        send_via_brevo(subject, html_content, order.user.email, attachments)
         return f"Invoice email sent to {order.user.email}"
 
     except Exception as e:
         self.retry(exc=e, countdown=10)
         return f"Invoice email failed: {e}"
+
+
+@shared_task
+def relay_outbox():
+    """Send the pending outbox events to the broker."""
+    from .outbox import relay
+    return relay()
+
+
+@shared_task
+def purge_outbox():
+    from .outbox import purge
+    return purge()
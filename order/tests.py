@@ -1,3 +1,251 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
 from django.test import TestCase
+from rest_framework.test import APITestCase
+from cart.models import StockReservation
+from cart.services import AppliedCoupon, Cart, CartLine
+from coupon.models import Coupon
+from coupon.utils import invalidate_coupon
+from product.models import Product
+from . import outbox, tasks
+from .models import Order, OrderItem, OrderStatus, OutboxEvent
 
-# Create your tests here.
+
+User = get_user_model()
+
+ORDER_DATA = {
+    'first_name': 'Ada', 'last_name': 'Lovelace', 'city': 'London',
+    'address': '12 St James Square', 'email': 'ada@example.com', 'postal_code': 1000,
+}
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConfirmOrderTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Creating a user emails an OTP through an external API.
+        with mock.patch('account.signals.send_email_task'):
+            merchant = User.objects.create_user(
+                email='merchant@example.com', password='pass', roles=User.Roles.MERCHANT,
+            )
+            cls.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        cls.products = [
+            Product.objects.create(merchant=merchant.merchant_profile, name=f'Item {i}', price=2, amount=10)
+            for i in range(10)
+        ]
+        cls.coupon = Coupon.objects.create(
+            merchant=merchant.merchant_profile, product=cls.products[0], code='SAVE10', discount=10,
+            valid_from=timezone.now() - timedelta(days=1), valid_to=timezone.now() + timedelta(days=1),
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.customer)
+        # Coupons are also cached in-process, across tests.
+        invalidate_coupon(self.coupon.code)
+
+    def checkout(self, products, quantity=2, held=None):
+        """Confirm an order for ``products``; ``held`` units of each are reserved."""
+        held = quantity if held is None else held
+        if held:
+            StockReservation.objects.bulk_create([
+                StockReservation(
+                    user=self.customer, product=product, quantity=held,
+                    expires_at=timezone.now() + timedelta(hours=1),
+                )
+                for product in products
+            ])
+        cart = Cart(lines={
+            product.id: CartLine(product.id, product.name, quantity, Decimal('2.00'))
+            for product in products
+        })
+        with mock.patch('order.views.CartService.get_cart', return_value=cart):
+            return self.client.post(reverse('order:confirm'), ORDER_DATA)
+
+    def test_queries_do_not_grow_with_the_cart(self):
+        with self.assertNumQueries(12) as small:
+            self.assertEqual(self.checkout(self.products[:1]).status_code, 201)
+        with self.assertNumQueries(len(small.captured_queries)):
+            self.assertEqual(self.checkout(self.products[1:]).status_code, 201)
+
+        order = Order.objects.filter(user=self.customer).first()
+        self.assertEqual(order.order_item.count(), 9)
+        self.assertEqual(order.order_status.get().status, OrderStatus.Status.Pending)
+        self.assertEqual(order.get_status(), OrderStatus.Status.Pending)
+        self.assertFalse(StockReservation.objects.filter(user=self.customer).exists())
+        self.assertEqual(OutboxEvent.objects.filter(task='order.tasks.send_order_confirmation').count(), 2)
+
+    def checkout_with_coupon(self, code='SAVE10'):
+        products = self.products[:2]
+        cart = Cart(lines={
+            product.id: CartLine(product.id, product.name, 3, Decimal('2.00'))
+            for product in products
+        })
+        cart.coupon = AppliedCoupon.build(code, 10, products[0].id, Decimal('6.00'))
+        with mock.patch('order.views.CartService.get_cart', return_value=cart):
+            return self.client.post(reverse('order:confirm'), ORDER_DATA)
+
+    def test_totals_are_stored(self):
+        response = self.checkout_with_coupon()
+        self.assertEqual(response.data['subtotal'], '12.00')
+        self.assertEqual(response.data['discount'], '0.60')
+        self.assertEqual(response.data['total'], '11.40')
+        items = OrderItem.objects.order_by('product_id')
+        self.assertEqual([item.price for item in items], [Decimal('2.00')] * 2)
+        self.assertEqual([item.total for item in items], [Decimal('5.40'), Decimal('6.00')])
+
+    def test_coupon_is_checked_again_at_checkout(self):
+        Coupon.objects.filter(pk=self.coupon.pk).update(valid_to=timezone.now() - timedelta(hours=1))
+        invalidate_coupon('SAVE10')
+        self.assertEqual(self.checkout_with_coupon().status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+        self.assertEqual(self.checkout_with_coupon('GONE').status_code, 400)
+
+    def test_expired_hold_is_taken_from_stock(self):
+        product = self.products[0]
+        self.assertEqual(self.checkout([product], quantity=3, held=0).status_code, 201)
+        product.refresh_from_db()
+        self.assertEqual(product.amount, 7)
+
+    def test_not_enough_stock_rolls_back(self):
+        product = self.products[0]
+        response = self.checkout([product], quantity=11, held=0)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_empty_cart(self):
+        with mock.patch('order.views.CartService.get_cart', return_value=Cart()):
+            response = self.client.post(reverse('order:confirm'), ORDER_DATA)
+        self.assertEqual(response.status_code, 400)
+
+    def test_retry_with_idempotency_key_replays_the_order(self):
+        product = self.products[0]
+        headers = {'Idempotency-Key': 'checkout-1'}
+        cart = Cart(lines={product.id: CartLine(product.id, product.name, 1, Decimal('2.00'))})
+        with mock.patch('order.views.CartService.get_cart', return_value=cart):
+            first = self.client.post(reverse('order:confirm'), ORDER_DATA, headers=headers)
+            retry = self.client.post(reverse('order:confirm'), ORDER_DATA, headers=headers)
+            reused = self.client.post(
+                reverse('order:confirm'), {**ORDER_DATA, 'city': 'Paris'}, headers=headers,
+            )
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(Order.objects.filter(user=self.customer).count(), 1)
+
+    def test_new_status_becomes_current(self):
+        self.checkout(self.products[:1])
+        order = Order.objects.get(user=self.customer)
+        shipped = OrderStatus.objects.create(order=order, status=OrderStatus.Status.SHIPPED)
+        self.assertEqual(order.get_status(), OrderStatus.Status.SHIPPED)
+        order.refresh_from_db()
+        self.assertEqual(order.current_status, OrderStatus.Status.SHIPPED)
+        self.assertEqual(order.status_changed_at, shipped.timestamp)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderHistoryTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('account.signals.send_email_task'):
+            merchant = User.objects.create_user(
+                email='merchant@example.com', password='pass', roles=User.Roles.MERCHANT,
+            )
+            cls.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        products = [
+            Product.objects.create(merchant=merchant.merchant_profile, name=f'Item {i}', price=2)
+            for i in range(3)
+        ]
+        for i in range(4):
+            order = Order.objects.create(user=cls.customer, subtotal=12, total=12, **ORDER_DATA)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=2, price=2, total=4)
+                for product in products
+            ])
+
+    def setUp(self):
+        self.client.force_authenticate(self.customer)
+
+    def test_history_page(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order:order-history'), {'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNotNone(response.data['next'])
+        order = response.data['results'][0]
+        self.assertEqual(order['current_status'], OrderStatus.Status.Pending)
+        self.assertEqual(order['item_count'], 6)
+        self.assertEqual(order['total'], '12.00')
+        self.assertEqual(len(order['items']), 3)
+
+    def test_summary(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('order:order-history'), {'summary': 'true'})
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertNotIn('items', response.data['results'][0])
+
+
+class OutboxRelayTests(TestCase):
+
+    def setUp(self):
+        outbox.publish(
+            outbox.event('order.tasks.send_invoice_email', 'abc', dedup_key='invoice:abc'),
+            outbox.event('order.tasks.send_invoice_email', 'abc', dedup_key='invoice:abc'),
+            outbox.event('order.tasks.send_order_confirmation', 'abc'),
+        )
+
+    def test_relay_sends_pending_events_once(self):
+        self.assertEqual(OutboxEvent.objects.count(), 2)
+        with mock.patch('order.outbox.current_app.send_task') as send_task:
+            self.assertEqual(outbox.relay(), 2)
+            self.assertEqual(outbox.relay(), 0)
+        self.assertEqual(send_task.call_count, 2)
+        first = OutboxEvent.objects.order_by('id').first()
+        send_task.assert_any_call(
+            'order.tasks.send_invoice_email', args=['abc'], kwargs={}, task_id=f'outbox-{first.pk}',
+        )
+
+    def test_broker_failure_keeps_events_pending(self):
+        with mock.patch('order.outbox.current_app.send_task', side_effect=ConnectionError('down')):
+            self.assertEqual(outbox.relay(), 0)
+        self.assertEqual(OutboxEvent.objects.filter(sent_at__isnull=True).count(), 2)
+        self.assertEqual(OutboxEvent.objects.order_by('id').first().attempts, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderEmailTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('account.signals.send_email_task'):
+            customer = User.objects.create_user(email='customer@example.com', password='pass')
+        cls.order = Order.objects.create(user=customer, subtotal=12, total=12, **ORDER_DATA)
+
+    def test_redelivered_tasks_email_once(self):
+        with mock.patch('order.tasks.send_via_brevo') as send:
+            for _ in range(2):
+                tasks.send_order_confirmation.apply(args=[self.order.order_id])
+                tasks.send_invoice_email.apply(args=[self.order.order_id])
+        self.assertEqual(send.call_count, 2)
+        self.order.refresh_from_db()
+        self.assertIsNotNone(self.order.confirmation_sent_at)
+        self.assertIsNotNone(self.order.invoice_sent_at)
+
+    def test_failed_send_is_not_stamped(self):
+        with mock.patch('order.tasks.send_via_brevo', side_effect=Exception('down')):
+            tasks.send_order_confirmation.apply(args=[self.order.order_id])
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.confirmation_sent_at)
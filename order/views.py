@@ -1,8 +1,11 @@
 from django.shortcuts import get_object_or_404
 from rest_framework.generics import CreateAPIView
 from .models import Order , OrderItem , OrderStatus , OrderPayment
-from .serializers import OrderSerializer , OrderStatusSerializer,OrderPaymentSerializer
+from .serializers import OrderSerializer , OrderStatusSerializer,OrderPaymentSerializer,OrderHistorySerializer,OrderSummarySerializer
 from cart.views import CartService
+from cart.reservations import ReservationService
+from cart.services import AppliedCoupon
+from coupon.utils import get_active_coupon
 from product.models import Product
 from rest_framework.generics import CreateAPIView , UpdateAPIView , ListAPIView,RetrieveAPIView
 from rest_framework.permissions import IsAuthenticated
@@ -12,43 +15,90 @@ from product.models import Product
 from order.models import Order, OrderItem
 from .serializers import OrderSerializer
 from cart.views import CartService  
-from .tasks import send_order_confirmation , send_invoice_email
+from . import outbox
 from rest_framework.exceptions import NotFound,  ValidationError
-from recommendations.task import log_user_action
 from coupon.models import Referral 
 from django.db import transaction
+from django.db.models import Prefetch, Sum
+from django.db.models.functions import Coalesce
+from src.pagination import KeysetPagination
+from src.idempotency import IdempotentCreateMixin
+from decimal import Decimal
+from django.utils import timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-class ConfirmOrder(CreateAPIView):
+class ConfirmOrder(IdempotentCreateMixin, CreateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
-        
-        order = serializer.save(user=self.request.user)
-        cart = CartService.get_cart(self.request.user)
+        user = self.request.user
+        cart = CartService.get_cart(user)
         if not cart:
-            raise ValueError("Cart is empty!")
-        product_ids = cart.keys()
-        products = Product.objects.filter(id__in=product_ids)
-
-        for product in products:
-            item_data = cart.get(product.id)
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=item_data['quantity'],
-                price=item_data['total_price'],
-            )
-
-        send_order_confirmation.delay(order.order_id)
+            raise ValidationError("Cart is empty!")
+        quantities = {product_id: line.quantity for product_id, line in cart.lines.items()}
+        coupon = self.checked_coupon(cart)
 
+        # A fixed number of queries whatever the size of the cart.
+        with transaction.atomic():
+            existing = set(Product.objects.filter(id__in=quantities.keys()).values_list('id', flat=True))
+            gone = [cart.lines[pid].name for pid in quantities.keys() - existing]
+            if gone:
+                raise ValidationError({'products': f"No longer available: {', '.join(sorted(gone))}."})
+
+            items = [
+                OrderItem(
+                    product_id=line.product_id,
+                    quantity=line.quantity,
+                    price=line.unit_price,
+                    discount=coupon.amount_saved if coupon and coupon.product_id == line.product_id else 0,
+                )
+                for line in cart.items
+            ]
+            for item in items:
+                item.total = item.price * item.quantity - item.discount
+            subtotal = sum(item.price * item.quantity for item in items)
+            discount = sum(item.discount for item in items)
+            order = serializer.save(user=user, subtotal=subtotal, discount=discount, total=subtotal - discount)
+            for item in items:
+                item.order = order
+            OrderItem.objects.bulk_create(items)
+            short = ReservationService.checkout(user, quantities)
+            if short:
+                names = sorted(cart.lines[pid].name for pid in short)
+                raise ValidationError({'products': f"Not enough stock for: {', '.join(names)}."})
+
+            outbox.publish(outbox.event(
+                'order.tasks.send_order_confirmation', order.order_id,
+                dedup_key=f'order-confirmation:{order.order_id}',
+            ))
         return order
 
+    def checked_coupon(self, cart):
+        """
+        The cart's coupon, re-checked against the database: the cart only
+        remembers what was valid when the coupon was applied.
+        """
+        if cart.coupon is None:
+            return None
+        coupon = get_active_coupon(cart.coupon.code)
+        now = timezone.now()
+        if (
+            coupon is None
+            or not (coupon.valid_from <= now <= coupon.valid_to)
+            or coupon.product_id != cart.coupon.product_id
+        ):
+            raise ValidationError({'coupon': "This coupon is no longer valid; remove it to check out."})
+        line = cart.lines.get(coupon.product_id)
+        return AppliedCoupon.build(
+            coupon.code, coupon.discount, coupon.product_id,
+            line.total_price if line else Decimal('0.00'),
+        )
+
 
 class OrderUpdateAPIView(UpdateAPIView):
     queryset = OrderStatus.objects.all()
@@ -70,45 +120,56 @@ class OrderUpdateAPIView(UpdateAPIView):
 
 
 
-class OrderPaymentView(CreateAPIView):
+class OrderPaymentView(IdempotentCreateMixin, CreateAPIView):
     queryset = OrderPayment.objects.all()
     serializer_class = OrderPaymentSerializer
 
     def perform_create(self, serializer):
         order_id = self.kwargs.get('order_id')
-        order = get_object_or_404(Order, order_id=order_id)
-        if hasattr(order.user,'profile'):
-            user = order.user.profile
-            if hasattr(user,'referrals_received'):
-                try:
-                    referral = Referral.objects.get(referred=user.referrals_received)
-                    referral.reward_given = 300
-                    referral.save()
-                except Exception:
-                    pass
-        if OrderPayment.objects.filter(order=order).exists():
-            raise ValidationError("Order already paid.")
 
         with transaction.atomic():
+            # Lock the order so concurrent retries see each other's payment.
+            order = get_object_or_404(Order.objects.select_for_update(), order_id=order_id)
+            if order.paid or OrderPayment.objects.filter(order=order).exists():
+                raise ValidationError("Order already paid.")
+
+            if hasattr(order.user,'profile'):
+                user = order.user.profile
+                if hasattr(user,'referrals_received'):
+                    try:
+                        referral = Referral.objects.get(referred=user.referrals_received)
+                        referral.reward_given = 300
+                        referral.save()
+                    except Exception:
+                        pass
+
             order.paid = True
             CartService.clear_cart(order.user)
             order.save()
             order_payment = serializer.save(order=order)
 
-            try:
-                session_key = getattr(self.request.session, 'session_key', None)
-                log_user_action(
-                    user_id=order.user.id,
-                    order_item=order.order_item.id,
-                    action='purchase',
-                    metadata={
+            session_key = getattr(self.request.session, 'session_key', None)
+            purchases = [
+                {
+                    'user_id': order.user_id,
+                    'product_id': product_id,
+                    'order_item_id': item_id,
+                    'action': 'purchase',
+                    'session_id': session_key,
+                    'metadata': {
                         'source': 'order_payment',
                         'order_payment_id': order_payment.id,
                     },
-                )
-                send_invoice_email.delay(order.order_id)
-            except Exception as e:
-                logger.warning(f"Log user action failed: {e}")
+                }
+                for item_id, product_id in order.order_item.values_list('id', 'product_id')
+            ]
+            outbox.publish(
+                outbox.event('recommendations.task.log_user_actions', purchases),
+                outbox.event(
+                    'order.tasks.send_invoice_email', order.order_id,
+                    dedup_key=f'invoice:{order.order_id}',
+                ),
+            )
 
 
 
@@ -129,4 +190,32 @@ class OrderDetailAPIView(RetrieveAPIView):
         if not order:
             raise NotFound("No orders found for this user.")
         return order
-    
+
+
+
+class OrderHistoryAPIView(ListAPIView):
+    """
+    The customer's orders, newest first, with cursor pagination.
+    Items and their products come in one extra query for the whole page;
+    ``?summary=true`` leaves the items out and only returns the totals.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def is_summary(self):
+        return self.request.query_params.get('summary', '').lower() in ('1', 'true')
+
+    def get_serializer_class(self):
+        return OrderSummarySerializer if self.is_summary() else OrderHistorySerializer
+
+    def get_queryset(self):
+        queryset = (
+            Order.objects
+            .filter(user=self.request.user)
+            .annotate(item_count=Coalesce(Sum('order_item__quantity'), 0))
+        )
+        if self.is_summary():
+            return queryset
+        return queryset.prefetch_related(
+            Prefetch('order_item', queryset=OrderItem.objects.select_related('product').order_by('id'))
+        )
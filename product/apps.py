@@ -4,3 +4,5 @@ from django.apps import AppConfig
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'product'
+    def ready(self):
+        import product.signals
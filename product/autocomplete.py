@@ -0,0 +1,232 @@
+"""
+Search-as-you-type suggestions for product and category names, served from
+Redis only.
+
+Every suffix phrase of a normalized name ("red running shoes", "running
+shoes", "shoes") is indexed under each of its prefixes in a sorted set scored
+by popularity, so "run" and "running sh" both find the product. Each prefix
+keeps only its ``PREFIX_SIZE`` most popular entries. Suggestion documents
+live in one hash; a lookup is a single Lua call (ZREVRANGE + HMGET).
+
+Popularity is a weighted count of ``UserAction`` rows. ``rebuild_index``
+recomputes it and writes a fresh copy of the index under a new version
+before switching to it, so readers never see a half-built index. Product and
+category signals keep the current version up to date in between.
+"""
+import json
+import math
+import re
+from django.db import transaction
+from django.db.models import Case, IntegerField, Sum, Value, When
+from django_redis import get_redis_connection
+from .models import Category, Product
+
+
+MIN_PREFIX = 1
+MAX_PREFIX = 20
+PREFIX_SIZE = 50
+MAX_SUGGESTIONS = 10
+CATEGORY_BOOST = 1.0  # categories rank above equally popular products
+ACTION_WEIGHTS = {'view': 1, 'click': 1, 'add_to_cart': 3, 'purchase': 5}
+
+VERSION_KEY = 'ac:version'
+
+LOOKUP_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+local members = redis.call('ZREVRANGE', 'ac:' .. version .. ':p:' .. ARGV[1], 0, tonumber(ARGV[2]) - 1)
+if #members == 0 then
+    return {}
+end
+return redis.call('HMGET', 'ac:' .. version .. ':docs', unpack(members))
+"""
+
+_scripts = {}
+_non_word = re.compile(r'[^\w]+')
+
+
+def _connection():
+    try:
+        return get_redis_connection("default")
+    except NotImplementedError:
+        return None
+
+
+def normalize(text):
+    return ' '.join(_non_word.sub(' ', (text or '').lower()).split())
+
+
+def prefixes(text):
+    words = normalize(text).split()
+    found = set()
+    for start in range(len(words)):
+        phrase = ' '.join(words[start:])[:MAX_PREFIX]
+        for end in range(MIN_PREFIX, len(phrase) + 1):
+            found.add(phrase[:end].rstrip())
+    return found
+
+
+def _member(kind, pk):
+    return f'{kind[0]}:{pk}'
+
+
+class _Keys:
+    """Redis keys of one version of the index (must match LOOKUP_SCRIPT)."""
+
+    def __init__(self, version):
+        self.base = f'ac:{version}'
+        self.docs = f'{self.base}:docs'
+        self.popularity = f'{self.base}:pop'
+
+    def prefix(self, prefix):
+        return f'{self.base}:p:{prefix}'
+
+
+def _current_version(redis):
+    return int(redis.get(VERSION_KEY) or 0)
+
+
+def _write(pipe, keys, member, name, document, score):
+    pipe.hset(keys.docs, member, json.dumps(document))
+    pipe.hset(keys.popularity, member, score)
+    for prefix in prefixes(name):
+        key = keys.prefix(prefix)
+        pipe.zadd(key, {member: score})
+        pipe.zremrangebyrank(key, 0, -(PREFIX_SIZE + 1))
+
+
+def _documents(products=(), categories=()):
+    for product in products:
+        yield _member('product', product.pk), product.name, {
+            'type': 'product', 'slug': product.slug, 'name': product.name,
+        }
+    for category in categories:
+        yield _member('category', category.pk), category.name, {
+            'type': 'category', 'slug': category.slug, 'name': category.name,
+        }
+
+
+def _remove(redis, keys, members):
+    old = redis.hmget(keys.docs, members)
+    pipe = redis.pipeline(transaction=False)
+    for member, document in zip(members, old):
+        if document is None:
+            continue
+        for prefix in prefixes(json.loads(document)['name']):
+            pipe.zrem(keys.prefix(prefix), member)
+        pipe.hdel(keys.docs, member)
+    pipe.execute()
+
+
+def _index(products=(), categories=()):
+    redis = _connection()
+    if redis is None:
+        return
+    keys = _Keys(_current_version(redis))
+    entries = list(_documents(products, categories))
+    if not entries:
+        return
+    members = [member for member, _, _ in entries]
+    # Drop the old name's prefixes first in case the name changed.
+    _remove(redis, keys, members)
+    scores = redis.hmget(keys.popularity, members)
+    pipe = redis.pipeline(transaction=False)
+    for (member, name, document), score in zip(entries, scores):
+        if score is None:
+            score = CATEGORY_BOOST if document['type'] == 'category' else 0
+        _write(pipe, keys, member, name, document, float(score))
+    pipe.execute()
+
+
+def _unindex(members):
+    redis = _connection()
+    if redis is None:
+        return
+    keys = _Keys(_current_version(redis))
+    _remove(redis, keys, members)
+    redis.hdel(keys.popularity, *members)
+
+
+def index(products=(), categories=()):
+    """(Re)index the given products/categories once the transaction commits."""
+    products, categories = list(products), list(categories)
+    if products or categories:
+        transaction.on_commit(lambda: _index(products, categories))
+
+
+def unindex(kind, pks):
+    members = [_member(kind, pk) for pk in pks]
+    if members:
+        transaction.on_commit(lambda: _unindex(members))
+
+
+def popularity():
+    """Return ``{member: score}`` from weighted ``UserAction`` counts."""
+    from recommendations.models import UserAction
+
+    weight = Case(
+        *[When(action=action, then=Value(value)) for action, value in ACTION_WEIGHTS.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    actions = UserAction.objects.filter(product__isnull=False).order_by()
+    scores = {}
+    for row in actions.values('product_id').annotate(weight=Sum(weight)):
+        scores[_member('product', row['product_id'])] = math.log1p(row['weight'] or 0)
+    for row in actions.filter(product__category__isnull=False).values('product__category_id').annotate(weight=Sum(weight)):
+        scores[_member('category', row['product__category_id'])] = (
+            math.log1p(row['weight'] or 0) + CATEGORY_BOOST
+        )
+    return scores
+
+
+def rebuild_index(batch_size=1000):
+    """Build a fresh index from the database, switch to it and drop the old one."""
+    redis = _connection()
+    if redis is None:
+        return 0
+    old_version = _current_version(redis)
+    new_version = old_version + 1
+    keys = _Keys(new_version)
+    scores = popularity()
+
+    indexed = 0
+    sources = (
+        (Category.objects.only('id', 'slug', 'name'), 'categories', CATEGORY_BOOST),
+        (Product.objects.only('id', 'slug', 'name'), 'products', 0),
+    )
+    for queryset, kind, default_score in sources:
+        batch = []
+        for obj in queryset.iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                indexed += _write_batch(redis, keys, kind, batch, scores, default_score)
+                batch = []
+        if batch:
+            indexed += _write_batch(redis, keys, kind, batch, scores, default_score)
+
+    redis.set(VERSION_KEY, new_version)
+    for key in redis.scan_iter(match=f'ac:{old_version}:*', count=1000):
+        redis.unlink(key)
+    return indexed
+
+
+def _write_batch(redis, keys, kind, objects, scores, default_score):
+    documents = _documents(**{kind: objects})
+    pipe = redis.pipeline(transaction=False)
+    for member, name, document in documents:
+        _write(pipe, keys, member, name, document, scores.get(member, default_score))
+    pipe.execute()
+    return len(objects)
+
+
+def suggest(query, limit=MAX_SUGGESTIONS):
+    """Return up to ``limit`` suggestion documents for ``query``, most popular first."""
+    prefix = normalize(query)[:MAX_PREFIX]
+    redis = _connection()
+    if not prefix or redis is None:
+        return []
+    script = _scripts.get('lookup')
+    if script is None:
+        script = _scripts['lookup'] = redis.register_script(LOOKUP_SCRIPT)
+    documents = script(keys=[VERSION_KEY], args=[prefix, min(limit, MAX_SUGGESTIONS)])
+    return [json.loads(document) for document in documents if document]
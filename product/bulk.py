@@ -0,0 +1,262 @@
+"""
+Streaming bulk import and export of a merchant's products.
+
+Imports read the upload incrementally (CSV or NDJSON), validate each row with
+``ProductImportRowSerializer`` and insert valid rows with one ``bulk_create``
+per chunk. Each chunk costs one query for categories and one for slugs, no
+matter how many rows it holds. Rows that fail validation are reported with
+their line number and skipped; the rest of the file is still imported.
+
+Exports stream rows straight from a server-side cursor, in the same columns
+the importer accepts, so a file can be exported, edited and imported back.
+
+``update_products`` applies price/stock changes to many of a merchant's
+products at once, e.g. an ERP sync.
+"""
+import codecs
+import csv
+import json
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .cache import PRODUCTS, bump_generation, product_namespace
+from .models import Category, Product, SLUG_LOOKUP_BATCH
+from .serializers import ProductBulkUpdateRowSerializer, ProductImportRowSerializer
+from .stock import sync_stock
+from . import autocomplete
+
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+CONTENT_TYPES = {CSV: 'text/csv', NDJSON: 'application/x-ndjson'}
+FIELDS = ('name', 'description', 'price', 'amount', 'category')
+
+CHUNK_SIZE = SLUG_LOOKUP_BATCH  # one slug query per chunk
+MAX_REPORTED_ERRORS = 1000
+SLUG_RETRIES = 3  # a concurrent writer can take a slug between allocation and insert
+MAX_UPDATE_ROWS = 5000
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+
+
+def detect_format(filename):
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl')):
+        return NDJSON
+    return CSV
+
+
+def _iter_rows(stream, file_format):
+    """Yield ``(line_number, row)``; ``row`` is a dict, or an error string."""
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    if file_format == CSV:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Empty cells mean "use the default", not an empty value.
+            yield reader.line_num, {
+                key: value for key, value in row.items() if key and value not in ('', None)
+            }
+        return
+
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, "Each line must be a JSON object."
+            continue
+        yield line_number, row
+
+
+def _insert_chunk(merchant, rows):
+    """Insert validated ``(line_number, data)`` rows; returns row errors."""
+    category_slugs = {data['category'] for _, data in rows if data['category']}
+    categories = {
+        category.slug: category
+        for category in Category.objects.filter(slug__in=category_slugs)
+    }
+
+    errors = []
+    products = []
+    for line_number, data in rows:
+        category = None
+        if data['category']:
+            category = categories.get(data['category'])
+            if category is None:
+                errors.append({'line': line_number, 'errors': {'category': ["Unknown category."]}})
+                continue
+        products.append(Product(
+            merchant=merchant,
+            category=category,
+            name=data['name'],
+            description=data['description'],
+            price=data['price'],
+            amount=data['amount'],
+        ))
+
+    for attempt in range(SLUG_RETRIES):
+        slugs = Product.allocate_slugs([product.name for product in products])
+        for product, slug in zip(products, slugs):
+            product.slug = slug
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create(products)
+            break
+        except IntegrityError:
+            if attempt == SLUG_RETRIES - 1:
+                raise
+    autocomplete.index(products=products)
+    return len(products), errors
+
+
+def import_products(merchant, stream, file_format=CSV, chunk_size=CHUNK_SIZE):
+    """
+    Import products for ``merchant`` from a binary ``stream``.
+
+    Returns ``{'created': int, 'failed': int, 'errors': [...]}``; only the
+    first ``MAX_REPORTED_ERRORS`` row errors are listed.
+    """
+    created = 0
+    failed = 0
+    errors = []
+
+    def report(row_errors):
+        nonlocal failed
+        failed += len(row_errors)
+        errors.extend(row_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    chunk = []
+    for line_number, row in _iter_rows(stream, file_format):
+        if isinstance(row, str):
+            report([{'line': line_number, 'errors': {'non_field_errors': [row]}}])
+            continue
+        serializer = ProductImportRowSerializer(data=row)
+        if not serializer.is_valid():
+            report([{'line': line_number, 'errors': serializer.errors}])
+            continue
+        chunk.append((line_number, serializer.validated_data))
+        if len(chunk) >= chunk_size:
+            inserted, row_errors = _insert_chunk(merchant, chunk)
+            created += inserted
+            report(row_errors)
+            chunk = []
+
+    if chunk:
+        inserted, row_errors = _insert_chunk(merchant, chunk)
+        created += inserted
+        report(row_errors)
+
+    if created:
+        # bulk_create skips post_save, so invalidate listings once here.
+        bump_generation(PRODUCTS)
+    return {'created': created, 'failed': failed, 'errors': errors}
+
+
+class _Echo:
+    """File-like object whose ``write`` just returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_products(queryset, file_format=CSV, chunk_size=CHUNK_SIZE):
+    """Yield the products in ``queryset`` as CSV or NDJSON text, row by row."""
+    rows = (
+        queryset.order_by('id')
+        .values_list('name', 'description', 'price', 'amount', 'category__slug')
+        .iterator(chunk_size=chunk_size)
+    )
+    if file_format == CSV:
+        writer = csv.writer(_Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow(row)
+        return
+
+    for name, description, price, amount, category in rows:
+        yield json.dumps({
+            'name': name,
+            'description': description,
+            'price': str(price),
+            'amount': amount,
+            'category': category,
+        }) + '\n'
+
+
+def update_products(merchant, rows):
+    """
+    Apply ``[{slug, price?, amount?}, ...]`` to ``merchant``'s products.
+
+    Ownership is checked for the whole set with one query and changes are
+    written with ``bulk_update``. Returns one ``{'slug', 'status'}`` result
+    per input row, in order, with ``errors`` for invalid rows. Slugs the
+    merchant doesn't own are reported as not found.
+    """
+    results = []
+    valid = {}
+    for row in rows:
+        serializer = ProductBulkUpdateRowSerializer(data=row)
+        slug = row.get('slug') if isinstance(row, dict) else None
+        if not serializer.is_valid():
+            results.append({'slug': slug, 'status': INVALID, 'errors': serializer.errors})
+        elif slug in valid:
+            results.append({'slug': slug, 'status': INVALID,
+                            'errors': {'slug': ["Duplicate slug in request."]}})
+        else:
+            valid[slug] = serializer.validated_data
+            results.append({'slug': slug, 'status': None})
+
+    products = {
+        product.slug: product
+        for product in Product.objects.filter(merchant=merchant, slug__in=list(valid))
+        .only('id', 'slug', 'price', 'amount')
+    }
+
+    # Rows are grouped by the columns they change so a price-only update
+    # never writes back a stale ``amount`` over a concurrent reservation.
+    # An ERP sync sends the same columns on every row: one bulk_update.
+    changed = {}
+    now = timezone.now()
+    for result in results:
+        if result['status'] is not None:
+            continue
+        product = products.get(result['slug'])
+        if product is None:
+            result['status'] = NOT_FOUND
+            continue
+        fields = tuple(
+            field for field, value in valid[result['slug']].items()
+            if field != 'slug' and getattr(product, field) != value
+        )
+        if not fields:
+            result['status'] = UNCHANGED
+            continue
+        for field in fields:
+            setattr(product, field, valid[result['slug']][field])
+        product.updated_at = now
+        changed.setdefault(fields, []).append(product)
+        result['status'] = UPDATED
+
+    if changed:
+        with transaction.atomic():
+            for fields, group in changed.items():
+                # bulk_update doesn't apply auto_now.
+                Product.objects.bulk_update(group, fields + ('updated_at',), batch_size=CHUNK_SIZE)
+            sync_stock(
+                product.id
+                for fields, group in changed.items() if 'amount' in fields
+                for product in group
+            )
+        # Stock lives outside the cached documents (see product.stock), so
+        # only price changes invalidate them. Listings can't be targeted per
+        # product, so they are bumped once.
+        repriced = [product.slug for fields, group in changed.items() if 'price' in fields for product in group]
+        if repriced:
+            bump_generation(PRODUCTS, *(product_namespace(slug) for slug in repriced))
+    return results
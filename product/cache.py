@@ -0,0 +1,98 @@
+"""
+Versioned cache keys for catalog data.
+
+Every cached catalog entry embeds the generation of the namespace it belongs
+to. Signals in ``product.signals`` bump the generation when the underlying rows
+change, which orphans the old entries (they simply age out) instead of having
+to find and delete them. Generations are read on nearly every catalog request,
+so they are also kept in the in-process tier of ``src.cache``.
+"""
+import time
+from hashlib import md5
+from django.core.cache import cache
+from src.cache import local_get_many, invalidate_local
+
+
+PRODUCTS = 'products'
+CATEGORIES = 'categories'
+
+
+def product_namespace(slug):
+    return f'product_{slug}'
+
+
+def ratings_namespace(product_id):
+    return f'ratings_{product_id}'
+
+
+def _generation_key(namespace):
+    return f'gen_{namespace}'
+
+
+def _initial_generation():
+    # Seeded from the clock so a generation that was evicted never restarts
+    # at a number an older, still cached entry was written with.
+    return int(time.time() * 1000)
+
+
+def _fetch_generations(keys):
+    found = cache.get_many(keys)
+    for key in keys:
+        if found.get(key) is None:
+            generation = _initial_generation()
+            if not cache.add(key, generation, timeout=None):
+                generation = cache.get(key, generation)
+            found[key] = generation
+    return found
+
+
+def get_generations(*namespaces):
+    """Return ``{namespace: generation}`` in at most one Redis round trip."""
+    keys = {_generation_key(namespace): namespace for namespace in namespaces}
+    found = local_get_many(list(keys), _fetch_generations)
+    return {namespace: found[key] for key, namespace in keys.items()}
+
+
+def get_generation(namespace):
+    return get_generations(namespace)[namespace]
+
+
+def bump_generation(*namespaces):
+    keys = [_generation_key(namespace) for namespace in namespaces]
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), timeout=None)
+    invalidate_local(*keys)
+
+
+def query_digest(params):
+    """Stable digest of request query parameters for use inside a cache key."""
+    query = '&'.join(f'{key}={value}' for key, value in sorted(params.items()))
+    return md5(query.encode()).hexdigest()
+
+
+def product_list_key(category_slug, params):
+    generation = get_generation(PRODUCTS)
+    return f'products_{category_slug or "all"}_v{generation}_{query_digest(params)}'
+
+
+def facets_key(params):
+    generation = get_generation(PRODUCTS)
+    return f'product_facets_v{generation}_{query_digest(params)}'
+
+
+def product_detail_key(slug):
+    namespace = product_namespace(slug)
+    generations = get_generations(namespace, CATEGORIES)
+    return f'product_{slug}_v{generations[namespace]}.{generations[CATEGORIES]}'
+
+
+def category_list_key():
+    return f'categories_list_v{get_generation(CATEGORIES)}'
+
+
+def ratings_key(product_id):
+    namespace = ratings_namespace(product_id)
+    return f'ratings_{product_id}_v{get_generation(namespace)}'
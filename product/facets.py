@@ -0,0 +1,168 @@
+"""
+Faceted filtering of the product catalog.
+
+Facets are ``category`` (slugs), ``merchant`` (ids), ``price`` (bucket labels)
+and ``in_stock``; multiple values of one facet are OR-ed, facets are AND-ed.
+Each is given as a comma separated query parameter, e.g.
+``?category=books,games&price=0-25&in_stock=true``.
+
+``facet_counts`` computes every facet's counts with a single grouped query
+over ``(category, merchant, price bucket, in stock)``; the per-facet numbers
+are then summed in Python. Counts are disjunctive: a facet's counts apply
+every other facet's filter but not its own, so selecting one category still
+shows how many products the other categories would add.
+"""
+from django.db.models import BooleanField, Case, CharField, Count, Q, Value, When
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+CATEGORY = 'category'
+MERCHANT = 'merchant'
+PRICE = 'price'
+IN_STOCK = 'in_stock'
+FACETS = (CATEGORY, MERCHANT, PRICE, IN_STOCK)
+
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = (
+    ('0-25', None, 25),
+    ('25-50', 25, 50),
+    ('50-100', 50, 100),
+    ('100-250', 100, 250),
+    ('250+', 250, None),
+)
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def parse_filters(params):
+    """Validate the facet query parameters; returns ``{facet: values}``."""
+    filters = {}
+    if params.get(CATEGORY):
+        filters[CATEGORY] = set(_split(params[CATEGORY]))
+    if params.get(MERCHANT):
+        try:
+            filters[MERCHANT] = {int(value) for value in _split(params[MERCHANT])}
+        except ValueError:
+            raise ValidationError({MERCHANT: "Must be a comma separated list of merchant ids."})
+    if params.get(PRICE):
+        labels = {label for label, _, _ in PRICE_BUCKETS}
+        filters[PRICE] = set(_split(params[PRICE]))
+        if not filters[PRICE] <= labels:
+            raise ValidationError({PRICE: f"Must be one of: {', '.join(label for label, _, _ in PRICE_BUCKETS)}."})
+    if params.get(IN_STOCK):
+        value = params[IN_STOCK].lower()
+        if value not in ('true', 'false'):
+            raise ValidationError({IN_STOCK: "Must be true or false."})
+        filters[IN_STOCK] = {value == 'true'}
+    return filters
+
+
+def _price_condition(label):
+    _, low, high = next(bucket for bucket in PRICE_BUCKETS if bucket[0] == label)
+    condition = Q()
+    if low is not None:
+        condition &= Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def _condition(facet, values):
+    if facet == CATEGORY:
+        return Q(category__slug__in=values)
+    if facet == MERCHANT:
+        return Q(merchant_id__in=values)
+    if facet == PRICE:
+        condition = Q()
+        for label in values:
+            condition |= _price_condition(label)
+        return condition
+    in_stock = next(iter(values))
+    return Q(amount__gt=0) if in_stock else Q(amount=0)
+
+
+def apply_filters(queryset, filters):
+    for facet, values in filters.items():
+        queryset = queryset.filter(_condition(facet, values))
+    return queryset
+
+
+def _price_bucket():
+    return Case(
+        *[When(_price_condition(label), then=Value(label)) for label, _, _ in PRICE_BUCKETS],
+        output_field=CharField(),
+    )
+
+
+def facet_counts(queryset, filters):
+    """
+    Return ``{'total': int, <facet>: [{'value', 'label', 'count', 'selected'}]}``
+    for ``queryset`` narrowed by ``filters`` (see ``parse_filters``).
+    """
+    groups = (
+        queryset
+        .annotate(
+            price_bucket=_price_bucket(),
+            in_stock=Case(When(amount__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        )
+        .order_by()
+        .values(
+            'category__slug', 'category__name', 'merchant_id', 'merchant__business_name',
+            'price_bucket', 'in_stock',
+        )
+        .annotate(count=Count('id'))
+    )
+
+    counts = {facet: {} for facet in FACETS}
+    labels = {CATEGORY: {}, MERCHANT: {}}
+    total = 0
+    for group in groups:
+        values = {
+            CATEGORY: group['category__slug'],
+            MERCHANT: group['merchant_id'],
+            PRICE: group['price_bucket'],
+            IN_STOCK: group['in_stock'],
+        }
+        labels[CATEGORY][values[CATEGORY]] = group['category__name']
+        labels[MERCHANT][values[MERCHANT]] = group['merchant__business_name']
+        matches = {
+            facet: facet not in filters or values[facet] in filters[facet]
+            for facet in FACETS
+        }
+        if all(matches.values()):
+            total += group['count']
+        for facet in FACETS:
+            if values[facet] is None:
+                continue
+            if all(matched for other, matched in matches.items() if other != facet):
+                counts[facet][values[facet]] = counts[facet].get(values[facet], 0) + group['count']
+
+    def options(facet, ordered_values, label_for):
+        selected = filters.get(facet, set())
+        return [
+            {
+                'value': value,
+                'label': label_for(value),
+                'count': counts[facet].get(value, 0),
+                'selected': value in selected,
+            }
+            for value in ordered_values
+        ]
+
+    return {
+        'total': total,
+        CATEGORY: options(CATEGORY, sorted(v for v in labels[CATEGORY] if v is not None), labels[CATEGORY].get),
+        MERCHANT: options(MERCHANT, sorted(labels[MERCHANT]), labels[MERCHANT].get),
+        PRICE: options(PRICE, [label for label, _, _ in PRICE_BUCKETS], str),
+        IN_STOCK: options(IN_STOCK, [True, False], lambda value: 'In stock' if value else 'Out of stock'),
+    }
+
+
+class ProductFacetFilter(BaseFilterBackend):
+    """Applies the facet query parameters to a product listing."""
+
+    def filter_queryset(self, request, queryset, view):
+        return apply_filters(queryset, parse_filters(request.query_params))
@@ -0,0 +1,22 @@
+"""
+Read path for product listings.
+
+Listings never need model instances: ``listing_values`` selects exactly the
+columns ``ProductListSerializer`` renders, joining category and merchant user
+in the same query, so a page costs one query however many merchants it spans.
+"""
+from .models import Product
+
+
+LISTING_FIELDS = (
+    'id', 'name', 'slug', 'description', 'price', 'amount',
+    'category_id', 'category__name', 'merchant_id', 'merchant__user__email',
+    'created_at', 'updated_at', 'rating_avg', 'rating_count',
+)
+
+
+def listing_values(queryset=None):
+    """Return ``queryset`` (default: all products) as listing rows (dicts)."""
+    if queryset is None:
+        queryset = Product.objects.all()
+    return queryset.values(*LISTING_FIELDS)
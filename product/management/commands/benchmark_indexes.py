@@ -0,0 +1,207 @@
+"""
+Before/after benchmark for the composite indexes on the catalog, order and
+coupon tables.
+
+Each query below mirrors one the views actually run. For every query the
+command prints the plan and the median time with the indexes declared in the
+models' ``Meta.indexes`` in place ("after"), then drops those indexes inside
+a transaction, measures again ("before") and rolls back, so the database is
+left exactly as it was. Use ``--generate`` to fill an empty database with a
+reproducible synthetic dataset first.
+
+Run it against a disposable database: ``--generate`` inserts a lot of rows.
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from coupon.models import Coupon
+from order.models import Order, OrderItem, OrderStatus
+from product.models import Category, Product
+from user_profile.models import MerchantProfile
+
+
+User = get_user_model()
+
+INDEXED_MODELS = (Product, OrderItem, OrderStatus, Coupon)
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _queries():
+    """``[(name, build)]``; ``build()`` returns an unevaluated queryset."""
+    category = Category.objects.order_by('id').first()
+    merchant = MerchantProfile.objects.filter(products__isnull=False).order_by('id').first()
+    product = Product.objects.filter(coupon__isnull=False).order_by('id').first()
+    coupon = Coupon.objects.order_by('id').first()
+    order = Order.objects.order_by('-id').first()
+    if not all([category, merchant, product, coupon, order]):
+        raise CommandError("Not enough data to benchmark; run with --generate first.")
+
+    return [
+        # product.views.ProductListAPIView, ?category=<slug>, first page
+        ('product list by category', lambda: Product.objects.filter(
+            category__slug=category.slug).order_by('-created_at', '-id')[:10]),
+        # product.views.ProductListAPIView, ?ordering=price
+        ('product list by price', lambda: Product.objects.order_by('price', 'id')[:10]),
+        # dashboard.views.BaseMerchantProductsView
+        ('merchant products by date', lambda: Product.objects.filter(
+            merchant=merchant).order_by('-created_at', '-id')[:10]),
+        # dashboard.views.MerchantChartDataView
+        ('merchant sales chart', lambda: OrderItem.objects.filter(
+            product__merchant=merchant).values('order__created_at__date')
+            .annotate(total_sales=Sum('total')).order_by('order__created_at__date')),
+        # dashboard.views.GenerateReport
+        ('merchant paid report', lambda: OrderItem.objects.filter(
+            product__merchant=merchant, order__paid=True,
+            order__created_at__range=(timezone.now() - timedelta(days=30), timezone.now()),
+        ).select_related('product', 'order')),
+        # cart.views.CartViewSet.apply_coupon / coupon.utils.get_active_coupon
+        ('coupon by code', lambda: Coupon.objects.filter(code=coupon.code, active=True)[:1]),
+        # coupon.views, coupons of a product
+        ('coupons by product', lambda: Coupon.objects.filter(product=product)),
+        # latest entry of an order's status history
+        ('latest order status', lambda: OrderStatus.objects.filter(
+            order=order).order_by('-timestamp')[:1]),
+        # orders that were shipped in the last week
+        ('shipped since', lambda: OrderStatus.objects.filter(
+            status=OrderStatus.Status.SHIPPED,
+            timestamp__gte=timezone.now() - timedelta(days=7)).values('order_id')),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Show query plans and timings with and without the composite indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', type=int, metavar='PRODUCTS', default=0,
+                            help="First generate a dataset with this many products.")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, generate, repeat, seed, **options):
+        if generate:
+            self.generate(generate, random.Random(seed))
+
+        queries = _queries()
+        after = self.measure(queries, repeat)
+        # SQLite keeps using already prepared statements (and their plans)
+        # after the indexes are dropped; start over on a fresh connection.
+        connection.close()
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    for model in INDEXED_MODELS:
+                        for index in model._meta.indexes:
+                            cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+                before = self.measure(queries, repeat)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        for name, _ in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {name}"))
+            for label, results in (('before', before), ('after', after)):
+                plan, median = results[name]
+                self.stdout.write(f"-- {label}: {median:.3f} ms (median of {repeat})")
+                self.stdout.write(plan)
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\n== summary (median ms)"))
+        for name, _ in queries:
+            self.stdout.write(f"{name:<28} before {before[name][1]:>9.3f}   after {after[name][1]:>9.3f}")
+
+    def measure(self, queries, repeat):
+        analyze = connection.vendor == 'postgresql'
+        results = {}
+        for name, build in queries:
+            plan = build().explain(analyze=True) if analyze else build().explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (plan, statistics.median(timings))
+        return results
+
+    def generate(self, products, rng):
+        """Insert a synthetic dataset scaled on the number of products."""
+        merchants_count = max(products // 500, 1)
+        categories_count = max(products // 2000, 5)
+        orders_count = products
+        now = timezone.now()
+        self.stdout.write(f"Generating {products} products, {orders_count} orders...")
+
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(email=f'bench-merchant-{i}-{rng.random()}@example.com', roles='Merchant')
+                for i in range(merchants_count)
+            ] + [
+                User(email=f'bench-customer-{i}-{rng.random()}@example.com')
+                for i in range(merchants_count)
+            ])
+            merchants = MerchantProfile.objects.bulk_create([
+                MerchantProfile(user=user, business_name=f'Bench {i}')
+                for i, user in enumerate(users[:merchants_count])
+            ])
+            customers = users[merchants_count:]
+            categories = Category.objects.bulk_create([
+                Category(name=f'Bench category {i} {rng.random()}', slug=f'bench-{i}-{rng.randrange(10**9)}')
+                for i in range(categories_count)
+            ])
+            catalog = Product.objects.bulk_create([
+                Product(
+                    merchant=rng.choice(merchants),
+                    category=rng.choice(categories),
+                    name=f'Bench product {i}',
+                    slug=f'bench-product-{i}-{rng.randrange(10**9)}',
+                    price=Decimal(rng.randrange(100, 100000)) / 100,
+                    amount=rng.randrange(0, 100),
+                )
+                for i in range(products)
+            ], batch_size=1000)
+            Coupon.objects.bulk_create([
+                Coupon(
+                    merchant=product.merchant, product=product,
+                    code=f'{rng.randrange(16**8):08x}', discount=rng.randrange(5, 50),
+                    valid_from=now - timedelta(days=10), valid_to=now + timedelta(days=10),
+                    active=rng.random() < 0.8,
+                )
+                for product in rng.sample(catalog, max(products // 10, 1))
+            ], batch_size=1000, ignore_conflicts=True)
+            orders = Order.objects.bulk_create([
+                Order(
+                    user=rng.choice(customers), order_id=f'{i:08x}'[-8:],
+                    first_name='Bench', last_name='Bench', city='Bench', address='Bench',
+                    email='bench@example.com', postal_code=1000,
+                    created_at=now - timedelta(minutes=rng.randrange(60 * 24 * 90)),
+                    paid=rng.random() < 0.7,
+                )
+                for i in range(orders_count)
+            ], batch_size=1000, ignore_conflicts=True)
+            orders = list(Order.objects.filter(email='bench@example.com').only('id'))
+            items = [
+                OrderItem(
+                    order=order, product=rng.choice(catalog),
+                    price=Decimal(rng.randrange(100, 9999)) / 100, quantity=rng.randrange(1, 5),
+                )
+                for order in orders for _ in range(rng.randrange(1, 5))
+            ]
+            for item in items:
+                item.total = item.price * item.quantity
+            OrderItem.objects.bulk_create(items, batch_size=1000)
+            OrderStatus.objects.bulk_create([
+                OrderStatus(order=order, status=status)
+                for order in orders
+                for status in [OrderStatus.Status.Pending, OrderStatus.Status.SHIPPED][:rng.randrange(1, 3)]
+            ], batch_size=1000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
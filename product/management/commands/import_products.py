@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from product import bulk
+from user_profile.models import MerchantProfile
+
+
+class Command(BaseCommand):
+    help = "Bulk import products for a merchant from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('merchant_id', type=int)
+        parser.add_argument('path')
+        parser.add_argument('--format', dest='file_format', choices=bulk.FORMATS,
+                            help="Defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=bulk.CHUNK_SIZE)
+
+    def handle(self, *args, merchant_id, path, file_format, chunk_size, **options):
+        try:
+            merchant = MerchantProfile.objects.get(pk=merchant_id)
+        except MerchantProfile.DoesNotExist:
+            raise CommandError(f"Merchant {merchant_id} does not exist.")
+
+        with open(path, 'rb') as stream:
+            result = bulk.import_products(
+                merchant, stream, file_format or bulk.detect_format(path), chunk_size
+            )
+
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} products, {result['failed']} rows failed."
+        ))
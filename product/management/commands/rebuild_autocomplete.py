@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from product.autocomplete import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Redis autocomplete index for product and category names."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size, **options):
+        indexed = rebuild_index(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} products and categories."))
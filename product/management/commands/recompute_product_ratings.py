@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from product.cache import CATEGORIES, PRODUCTS, bump_generation, product_namespace
+from product.models import Product
+from product.ratings import recompute_ratings
+
+
+class Command(BaseCommand):
+    help = "Rebuild Product.rating_sum/rating_count/rating_avg from ProductRating rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help="Only recompute these products (default: all).")
+
+    def handle(self, *args, slugs, **options):
+        queryset = Product.objects.all()
+        if slugs:
+            queryset = queryset.filter(slug__in=slugs)
+        updated = recompute_ratings(queryset)
+
+        if slugs:
+            bump_generation(PRODUCTS, *(product_namespace(slug) for slug in slugs))
+        else:
+            # Every product document embeds the categories generation, so
+            # bumping it refreshes them all without one bump per product.
+            bump_generation(PRODUCTS, CATEGORIES)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed ratings for {updated} products."))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:10
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('product', 'Product')
+    ProductRating = apps.get_model('product', 'ProductRating')
+    ratings = ProductRating.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.update(
+        rating_sum=Coalesce(Subquery(ratings.annotate(total=Sum('rating')).values('total')), 0, output_field=IntegerField()),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count('pk')).values('total')), 0, output_field=IntegerField()),
+        rating_avg=Coalesce(Subquery(ratings.annotate(avg=Avg('rating')).values('avg')), 0.0, output_field=FloatField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0003_product_listing_indexes'),
+        ('user_profile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating_avg', 'id'], name='product_pro_rating__0f85ca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'rating_avg', 'id'], name='product_pro_categor_fcf810_idx'),
+        ),
+    ]
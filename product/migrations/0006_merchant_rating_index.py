@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_product_updated_at'),
+        ('user_profile', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['merchant', 'rating_avg', 'id'], name='product_pro_merchan_d7b1b6_idx'),
+        ),
+    ]
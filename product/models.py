@@ -1,6 +1,12 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from user_profile.models import MerchantProfile,CustomerProfile
 from django.utils.text import slugify
+
+
+SLUG_LOOKUP_BATCH = 500
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(unique=True, blank=True)
@@ -26,19 +32,70 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Filled by a database trigger on PostgreSQL (see migration 0002); stays
+    # empty on other backends, where product.search falls back to icontains.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Maintained by product.ratings from ProductRating signals; run the
+    # recompute_product_ratings command to repair drift.
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        # One (<column>, id) index per ordering the cursor-paginated listings expose.
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['category', '-created_at', '-id']),
+            models.Index(fields=['category', 'price', 'id']),
+            models.Index(fields=['merchant', '-created_at', '-id']),
+            models.Index(fields=['merchant', 'price', 'id']),
+            models.Index(fields=['rating_avg', 'id']),
+            models.Index(fields=['category', 'rating_avg', 'id']),
+            models.Index(fields=['merchant', 'rating_avg', 'id']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.name)
-            slug = base_slug
-            count = 1
-            # ensure uniqueness
-            while Product.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{count}"
-                count += 1
-            self.slug = slug
+            self.slug = Product.allocate_slugs([self.name])[0]
         super().save(*args, **kwargs)
 
+    @classmethod
+    def allocate_slugs(cls, names):
+        """
+        Return a unique slug for each name, in order, using one query for the
+        whole batch. Duplicates get ``<base>-<n>`` suffixes past the highest
+        suffix already taken.
+        """
+        # Leave room for a suffix within the column's 50 characters.
+        bases = [slugify(name)[:40].rstrip('-') or 'product' for name in names]
+        unique_bases = list(set(bases))
+        taken = set()
+        # Batched so the OR chain stays within database expression limits
+        # (SQLite allows a depth of 1000); bulk imports use chunks this size.
+        for start in range(0, len(unique_bases), SLUG_LOOKUP_BATCH):
+            batch = unique_bases[start:start + SLUG_LOOKUP_BATCH]
+            lookup = models.Q(slug__in=batch)
+            for base in batch:
+                lookup |= models.Q(slug__startswith=f"{base}-")
+            taken.update(cls.objects.filter(lookup).values_list('slug', flat=True))
+
+        next_suffix = {}
+        slugs = []
+        for base in bases:
+            if base not in taken:
+                slug = base
+            else:
+                count = next_suffix.get(base, 1)
+                while f"{base}-{count}" in taken:
+                    count += 1
+                slug = f"{base}-{count}"
+                next_suffix[base] = count + 1
+            taken.add(slug)
+            slugs.append(slug)
+        return slugs
+
     def __str__(self):
         return f"{self.name} ({self.category})"
 
@@ -53,5 +110,13 @@ class ProductRating(models.Model):
     class Meta:
         unique_together = ("user", "product") 
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save handler adjust the product's aggregates by the
+        # difference without reading the old row again.
+        instance._loaded_rating = instance.__dict__.get('rating')
+        return instance
+
     def __str__(self):
         return f"{self.user.first_name} - {self.rating}⭐"
\ No newline at end of file
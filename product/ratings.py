@@ -0,0 +1,49 @@
+"""
+Denormalized rating aggregates on ``Product``.
+
+``rating_sum`` and ``rating_count`` are adjusted in place with a single UPDATE
+whenever a ``ProductRating`` changes, and ``rating_avg`` is derived from them in
+the same statement, so listings can sort by rating off an index instead of
+aggregating the ratings table on every request.
+"""
+from django.db.models import Avg, Case, Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now
+from .models import Product, ProductRating
+
+
+def apply_rating_delta(product_id, sum_delta, count_delta):
+    """Shift a product's aggregates by a rating being added, changed or removed."""
+    new_sum = F('rating_sum') + sum_delta
+    new_count = F('rating_count') + count_delta
+    Product.objects.filter(pk=product_id).update(
+        updated_at=Now(),
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating_avg=Case(
+            When(rating_count=-count_delta, then=Value(0.0)),
+            default=Cast(new_sum, FloatField()) / new_count,
+            output_field=FloatField(),
+        ),
+    )
+
+
+def recompute_ratings(queryset=None):
+    """Rebuild the aggregates from ``ProductRating`` rows; returns rows updated."""
+    if queryset is None:
+        queryset = Product.objects.all()
+    ratings = ProductRating.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    return queryset.update(
+        updated_at=Now(),
+        rating_sum=Coalesce(
+            Subquery(ratings.annotate(total=Sum('rating')).values('total')),
+            0, output_field=IntegerField(),
+        ),
+        rating_count=Coalesce(
+            Subquery(ratings.annotate(total=Count('pk')).values('total')),
+            0, output_field=IntegerField(),
+        ),
+        rating_avg=Coalesce(
+            Subquery(ratings.annotate(avg=Avg('rating')).values('avg')),
+            0.0, output_field=FloatField(),
+        ),
+    )
@@ -0,0 +1,47 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast
+from rest_framework.filters import SearchFilter
+
+
+SEARCH_CONFIG = 'english'
+
+
+def search_products(queryset, term):
+    """
+    Filter ``queryset`` down to products matching ``term``, best match first.
+
+    On PostgreSQL this hits the GIN-indexed ``search_vector`` column (name
+    weighted above description). Other backends, e.g. SQLite in tests, fall
+    back to requiring every word in the name or description.
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset
+
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+        return (
+            queryset
+            .filter(search_vector=query)
+            # ts_rank is a float4; widen it so the value a cursor stores is the
+            # exact value the next page compares against.
+            .annotate(rank=Cast(SearchRank(F('search_vector'), query), FloatField()))
+            .order_by('-rank', '-id')
+        )
+
+    condition = Q()
+    for word in term.split():
+        condition &= Q(name__icontains=word) | Q(description__icontains=word)
+    return queryset.filter(condition)
+
+
+class ProductSearchFilter(SearchFilter):
+    """Drop-in replacement for ``SearchFilter`` backed by ``search_products``."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search_products(queryset, ' '.join(terms))
@@ -18,9 +18,31 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'slug', 'description', 'price','amount',
             'category', 'category_name', 'merchant', 'merchant_name',
-            'created_at'
+            'created_at', 'updated_at', 'rating_avg', 'rating_count'
         ]
-        read_only_fields = ['slug', 'merchant', 'created_at', 'updated_at']
+        read_only_fields = ['slug', 'merchant', 'created_at', 'updated_at', 'rating_avg', 'rating_count']
+
+
+
+class ProductListSerializer(serializers.Serializer):
+    """
+    Read-only rendering of the rows from ``product.listing.listing_values``;
+    same output as ``ProductSerializer`` without per-row model access.
+    """
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    slug = serializers.CharField()
+    description = serializers.CharField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    amount = serializers.IntegerField()
+    category = serializers.IntegerField(source='category_id', allow_null=True)
+    category_name = serializers.CharField(source='category__name', allow_null=True)
+    merchant = serializers.IntegerField(source='merchant_id')
+    merchant_name = serializers.CharField(source='merchant__user__email')
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+    rating_avg = serializers.FloatField()
+    rating_count = serializers.IntegerField()
 
 
 
@@ -30,3 +52,23 @@ class ProductRatingSerializer(serializers.ModelSerializer):
         fields = ['comment', 'rating', 'user', 'created_at']
         read_only_fields = ['user', 'created_at']
 
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    """One row of a bulk product import; ``category`` is a category slug."""
+    name = serializers.CharField(max_length=100)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    amount = serializers.IntegerField(min_value=0, required=False, default=1)
+    category = serializers.SlugField(required=False, allow_blank=True, allow_null=True, default=None)
+
+
+class ProductBulkUpdateRowSerializer(serializers.Serializer):
+    slug = serializers.SlugField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    amount = serializers.IntegerField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        if 'price' not in attrs and 'amount' not in attrs:
+            raise serializers.ValidationError("Provide price, amount or both.")
+        return attrs
@@ -0,0 +1,81 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Product, ProductRating
+from .cache import (
+    CATEGORIES, PRODUCTS, bump_generation, product_namespace, ratings_namespace,
+)
+from .ratings import apply_rating_delta, recompute_ratings
+from .stock import forget_stock, sync_stock
+from . import autocomplete
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    bump_generation(PRODUCTS, product_namespace(instance.slug))
+
+
+@receiver(post_save, sender=Product)
+def mirror_stock(sender, instance, **kwargs):
+    sync_stock([instance.id])
+
+
+@receiver(post_delete, sender=Product)
+def drop_stock(sender, instance, **kwargs):
+    forget_stock([instance.id])
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    autocomplete.index(products=[instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    autocomplete.unindex('product', [instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, **kwargs):
+    autocomplete.index(categories=[instance])
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    autocomplete.unindex('category', [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    # Listings and product documents embed the category name.
+    bump_generation(CATEGORIES, PRODUCTS)
+
+
+@receiver(post_save, sender=ProductRating)
+def rating_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_rating_delta(instance.product_id, instance.rating, 1)
+    else:
+        previous = getattr(instance, '_loaded_rating', None)
+        if previous is None:
+            recompute_ratings(Product.objects.filter(pk=instance.product_id))
+        elif previous != instance.rating:
+            apply_rating_delta(instance.product_id, instance.rating - previous, 0)
+    instance._loaded_rating = instance.rating
+    invalidate_ratings(instance)
+
+
+@receiver(post_delete, sender=ProductRating)
+def rating_deleted(sender, instance, **kwargs):
+    apply_rating_delta(instance.product_id, -instance.rating, -1)
+    invalidate_ratings(instance)
+
+
+def invalidate_ratings(instance):
+    # The aggregates are written with update(), which skips Product's own
+    # signals. Listings show and sort by rating_avg and are cached for an
+    # hour, so they are bumped along with the product document.
+    slug = Product.objects.filter(pk=instance.product_id).values_list('slug', flat=True).first()
+    namespaces = [PRODUCTS, ratings_namespace(instance.product_id)]
+    if slug:
+        namespaces.append(product_namespace(slug))
+    bump_generation(*namespaces)
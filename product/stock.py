@@ -0,0 +1,104 @@
+"""
+Live stock counters.
+
+``Product.amount`` changes on every add-to-cart, so it is kept out of the cached
+product documents' lifetime: each product has a Redis counter ``stock:<id>``
+mirroring ``amount``, and cached listings/documents get the live value merged
+in at response time (one MGET per response).
+
+* Writers never send a relative ``INCRBY``: after their transaction commits,
+  ``sync_stock`` re-reads ``amount`` under ``SELECT ... FOR UPDATE`` and sets
+  the counter before releasing the lock. No writer can change the row in
+  between and every write is followed by such a read, so whichever commit
+  callback runs last sets the latest amount, whatever order they run in.
+* Readers load a missing counter from the database with ``SET NX``, so a
+  reader that read the database before a writer committed can't replace
+  the writer's fresh value with its stale one.
+* Counters expire after ``STOCK_TIMEOUT``.
+
+All writes happen after the surrounding transaction commits. When the cache
+isn't Redis (e.g. tests), reads go straight to the database.
+"""
+from django.db import transaction
+from django_redis import get_redis_connection
+from .models import Product
+
+
+STOCK_TIMEOUT = 60 * 10
+
+
+def _key(product_id):
+    return f"stock:{product_id}"
+
+
+def _connection():
+    try:
+        return get_redis_connection("default")
+    except NotImplementedError:
+        return None
+
+
+def get_stock(product_ids):
+    """Return ``{product_id: amount}`` from the counters, loading missing ones."""
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+    redis = _connection()
+    if redis is None:
+        return dict(Product.objects.filter(id__in=product_ids).values_list('id', 'amount'))
+
+    values = redis.mget([_key(pid) for pid in product_ids])
+    stock = {pid: int(value) for pid, value in zip(product_ids, values) if value is not None}
+    missing = [pid for pid in product_ids if pid not in stock]
+    if missing:
+        loaded = dict(Product.objects.filter(id__in=missing).values_list('id', 'amount'))
+        pipe = redis.pipeline(transaction=False)
+        for pid, amount in loaded.items():
+            # NX: never overwrite a counter a writer set in the meantime.
+            pipe.set(_key(pid), amount, ex=STOCK_TIMEOUT, nx=True)
+        pipe.execute()
+        stock.update(loaded)
+    return stock
+
+
+def merge_stock(documents):
+    """Overwrite ``amount`` in serialized products with the live stock."""
+    stock = get_stock(document['id'] for document in documents)
+    for document in documents:
+        document['amount'] = stock.get(document['id'], document['amount'])
+    return documents
+
+
+def _sync(product_ids):
+    redis = _connection()
+    if redis is None:
+        return
+    with transaction.atomic():
+        amounts = (
+            Product.objects.select_for_update()
+            .filter(id__in=product_ids).order_by('id')
+            .values_list('id', 'amount')
+        )
+        pipe = redis.pipeline(transaction=False)
+        for pid, amount in amounts:
+            pipe.set(_key(pid), amount, ex=STOCK_TIMEOUT)
+        pipe.execute()
+
+
+def _forget(product_ids):
+    redis = _connection()
+    if redis is not None:
+        redis.delete(*[_key(pid) for pid in product_ids])
+
+
+def sync_stock(product_ids):
+    """Mirror the ``amount`` of ``product_ids`` once the current transaction commits."""
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: _sync(product_ids))
+
+
+def forget_stock(product_ids):
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: _forget(product_ids))
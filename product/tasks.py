@@ -0,0 +1,8 @@
+from celery import shared_task
+from .autocomplete import rebuild_index
+
+
+@shared_task
+def rebuild_autocomplete_index():
+    """Refresh popularity weights and rebuild the autocomplete index."""
+    return rebuild_index()
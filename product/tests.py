@@ -1,3 +1,430 @@
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock, skipUnless
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.request import Request
 from django.test import TestCase
+from rest_framework.test import APIRequestFactory, APITestCase
+from src.pagination import ProductCursorPagination
+from recommendations.models import UserAction
+from . import bulk
+from .cache import PRODUCTS, product_namespace
+from .models import Category, Product, ProductRating
+from .stock import STOCK_TIMEOUT, sync_stock
 
-# Create your tests here.
+
+User = get_user_model()
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductListingQueryCountTests(APITestCase):
+    """A listing page costs the same number of queries however many merchants it spans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Creating a user emails an OTP through an external API.
+        with mock.patch('account.signals.send_email_task'):
+            cls.create_catalog()
+
+    @classmethod
+    def create_catalog(cls):
+        cls.category = Category.objects.create(name='Books')
+        cls.merchants = []
+        for i in range(12):
+            user = User.objects.create_user(
+                email=f'merchant{i}@example.com', password='pass', roles=User.Roles.MERCHANT,
+            )
+            cls.merchants.append(user)
+            Product.objects.create(
+                merchant=user.merchant_profile, category=cls.category,
+                name=f'Book {i}', price=10 + i,
+            )
+        cls.customer = User.objects.create_user(
+            email='customer@example.com', password='pass',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertConstantQueries(self, url, user, num):
+        for page_size in (2, 12):
+            self.client.force_authenticate(user)
+            with self.assertNumQueries(num):
+                response = self.client.get(url, {'page_size': page_size})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_product_list(self):
+        # The page itself plus the live stock lookup (the database when the
+        # cache isn't Redis).
+        self.assertConstantQueries(reverse('product:product-list-create'), self.customer, 2)
+
+    def test_cached_product_list_has_live_stock(self):
+        url = reverse('product:product-list-create')
+        self.client.force_authenticate(self.customer)
+        self.client.get(url, {'page_size': 1})
+        product = Product.objects.order_by('-created_at', '-id').first()
+        Product.objects.filter(pk=product.pk).update(amount=42)
+        response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(response.data['results'][0]['amount'], 42)
+
+    def test_cached_product_list_follows_ratings(self):
+        url = reverse('product:product-list-create')
+        self.client.force_authenticate(self.customer)
+        params = {'ordering': '-rating_avg', 'page_size': 1}
+        self.client.get(url, params)
+        product = Product.objects.order_by('id').first()
+        ProductRating.objects.create(product=product, user=self.customer.profile, rating=4)
+        row = self.client.get(url, params).data['results'][0]
+        self.assertEqual((row['id'], row['rating_avg'], row['rating_count']), (product.id, 4.0, 1))
+
+    def test_product_list_renders_related_fields(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(reverse('product:product-list-create'), {'page_size': 1})
+        row = response.data['results'][0]
+        self.assertEqual(row['category_name'], 'Books')
+        self.assertEqual(row['merchant_name'], 'merchant11@example.com')
+
+    def test_recent_viewed_products(self):
+        UserAction.objects.bulk_create([
+            UserAction(user=self.customer, product=product, action=UserAction.ACTION_VIEW)
+            for product in Product.objects.all()
+        ])
+        self.client.force_authenticate(self.customer)
+        url = reverse('recommendations:recent-products')
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def walk(self, params):
+        """Follow ``next`` links from the first page; returns the ids seen and the last response."""
+        url = reverse('product:product-list-create')
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(url, params)
+        ids = []
+        while True:
+            ids.extend(row['id'] for row in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_pages_through_ties(self):
+        # Every product is unrated, so the whole catalog ties on rating_avg.
+        for ordering in ('rating_avg', '-rating_avg'):
+            ids, last = self.walk({'ordering': ordering, 'page_size': 5})
+            self.assertEqual(len(ids), 12)
+            self.assertEqual(set(ids), set(Product.objects.values_list('id', flat=True)))
+
+            previous = self.client.get(last.data['previous'])
+            self.assertEqual([row['id'] for row in previous.data['results']], ids[5:10])
+
+    def test_rank_cursor_pages_through_ties(self):
+        # Ranks are floats that don't survive a round trip through a decimal
+        # string unless the cursor keeps them exactly; a third of them tie.
+        queryset = Product.objects.annotate(
+            rank=Cast(F('price') % 4, FloatField()) / 3,
+        )
+        paginator = ProductCursorPagination()
+        request = Request(APIRequestFactory().get('/', {'page_size': 5}))
+        ids = []
+        while True:
+            ids.extend(product.id for product in paginator.paginate_queryset(queryset, request))
+            link = paginator.get_next_link()
+            if not link:
+                break
+            request = Request(APIRequestFactory().get(link))
+        self.assertEqual(len(ids), 12)
+        expected = queryset.order_by('-rank', '-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text ranks need PostgreSQL')
+    def test_search_pages_through_ranks(self):
+        Product.objects.filter(price__lt=16).update(description='book')
+        ids, _ = self.walk({'search': 'book', 'page_size': 5})
+        self.assertEqual(len(ids), 12)
+        self.assertEqual(set(ids), set(Product.objects.values_list('id', flat=True)))
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.customer)
+        response = self.client.get(reverse('product:product-list-create'), {'cursor': 'bm9wZQ=='})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('account.signals.send_email_task'):
+            merchant = User.objects.create_user(
+                email='merchant@example.com', password='pass', roles=User.Roles.MERCHANT,
+            )
+            cls.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        cls.product = Product.objects.create(merchant=merchant.merchant_profile, name='Lamp', price=5)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.customer)
+        patcher = mock.patch('product.views.log_user_action')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_product_detail_not_modified(self):
+        url = reverse('product:product-detail', kwargs={'slug': self.product.slug})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response.headers)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response.headers['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_stock(self):
+        url = reverse('product:product-list-create')
+        etag = self.client.get(url).headers['ETag']
+        Product.objects.filter(pk=self.product.pk).update(amount=7)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_etag_changes_with_catalog(self):
+        url = reverse('product:category-list-create')
+        etag = self.client.get(url).headers['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Category.objects.create(name='Garden')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StockMirrorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('account.signals.send_email_task'):
+            merchant = User.objects.create_user(
+                email='merchant@example.com', password='pass', roles=User.Roles.MERCHANT,
+            )
+        cls.product = Product.objects.create(merchant=merchant.merchant_profile, name='Lamp', price=5, amount=3)
+
+    def test_late_commit_callback_sets_the_current_amount(self):
+        redis = mock.MagicMock()
+        with mock.patch('product.stock._connection', return_value=redis):
+            with self.captureOnCommitCallbacks() as callbacks:
+                Product.objects.filter(pk=self.product.pk).update(amount=7)
+                sync_stock([self.product.pk])
+            # A later writer commits before the first callback gets to run.
+            Product.objects.filter(pk=self.product.pk).update(amount=4)
+            for callback in callbacks:
+                callback()
+        redis.pipeline.return_value.set.assert_called_once_with(
+            f'stock:{self.product.pk}', 4, ex=STOCK_TIMEOUT,
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkUpdateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('account.signals.send_email_task'):
+            cls.merchant, other = (
+                User.objects.create_user(
+                    email=f'merchant{i}@example.com', password='pass', roles=User.Roles.MERCHANT,
+                ).merchant_profile
+                for i in range(2)
+            )
+        cls.lamp, cls.desk, cls.chair, cls.sofa = (
+            Product.objects.create(merchant=cls.merchant, name=name, price=price, amount=amount)
+            for name, price, amount in (('Lamp', 5, 3), ('Desk', 7, 2), ('Chair', 9, 1), ('Sofa', 20, 1))
+        )
+        cls.foreign = Product.objects.create(merchant=other, name='Rug', price=4)
+
+    def update(self, rows):
+        synced = []
+        with mock.patch.object(Product.objects, 'bulk_update', wraps=Product.objects.bulk_update) as bulk_update, \
+                mock.patch('product.bulk.bump_generation') as bump, \
+                mock.patch('product.bulk.sync_stock', side_effect=synced.extend):
+            results = bulk.update_products(self.merchant, rows)
+        return results, bulk_update, bump, synced
+
+    def test_statuses_and_groups(self):
+        results, bulk_update, bump, synced = self.update([
+            {'slug': self.lamp.slug, 'price': '6.00'},
+            {'slug': self.desk.slug, 'amount': 5},
+            {'slug': self.chair.slug, 'price': '9.00', 'amount': 1},
+            {'slug': self.sofa.slug, 'price': '18.00', 'amount': 4},
+            {'slug': self.foreign.slug, 'price': '1.00'},
+            {'slug': 'no-such-product', 'amount': 1},
+            {'slug': self.lamp.slug, 'amount': 1},
+            {'slug': self.desk.slug},
+        ])
+        self.assertEqual([result['status'] for result in results], [
+            bulk.UPDATED, bulk.UPDATED, bulk.UNCHANGED, bulk.UPDATED,
+            bulk.NOT_FOUND, bulk.NOT_FOUND, bulk.INVALID, bulk.INVALID,
+        ])
+        self.assertEqual(results[6]['errors'], {'slug': ["Duplicate slug in request."]})
+        self.assertIn('non_field_errors', results[7]['errors'])
+
+        # One bulk_update per set of changed columns.
+        groups = {
+            tuple(call.args[1]): [product.slug for product in call.args[0]]
+            for call in bulk_update.call_args_list
+        }
+        self.assertEqual(groups, {
+            ('price', 'updated_at'): [self.lamp.slug],
+            ('amount', 'updated_at'): [self.desk.slug],
+            ('price', 'amount', 'updated_at'): [self.sofa.slug],
+        })
+        self.assertEqual(
+            dict(Product.objects.filter(merchant=self.merchant).values_list('slug', 'price')),
+            {self.lamp.slug: 6, self.desk.slug: 7, self.chair.slug: 9, self.sofa.slug: 18},
+        )
+        self.assertEqual(Product.objects.get(pk=self.desk.pk).amount, 5)
+
+        bump.assert_called_once_with(
+            PRODUCTS, product_namespace(self.lamp.slug), product_namespace(self.sofa.slug),
+        )
+        self.assertEqual(sorted(synced), sorted([self.desk.id, self.sofa.id]))
+
+    def test_stock_only_update_keeps_cached_documents(self):
+        results, _, bump, synced = self.update([{'slug': self.lamp.slug, 'amount': 0}])
+        self.assertEqual(results[0]['status'], bulk.UPDATED)
+        bump.assert_not_called()
+        self.assertEqual(synced, [self.lamp.id])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('account.signals.send_email_task'):
+            cls.merchant = User.objects.create_user(
+                email='merchant@example.com', password='pass', roles=User.Roles.MERCHANT,
+            ).merchant_profile
+        cls.category = Category.objects.create(name='Lighting')
+
+    def run_import(self, content, file_format=bulk.CSV, **kwargs):
+        return bulk.import_products(self.merchant, BytesIO(content.encode()), file_format, **kwargs)
+
+    def test_csv(self):
+        result = self.run_import(
+            'name,description,price,amount,category\n'
+            f'Lamp,Warm light,5.50,3,{self.category.slug}\n'
+            'Desk,,40,,\n'
+        )
+        self.assertEqual(result, {'created': 2, 'failed': 0, 'errors': []})
+        lamp, desk = Product.objects.order_by('id')
+        self.assertEqual((lamp.price, lamp.amount, lamp.category), (Decimal('5.50'), 3, self.category))
+        self.assertEqual((desk.description, desk.amount, desk.category), ('', 1, None))
+
+    def test_ndjson(self):
+        result = self.run_import(
+            '{"name": "Lamp", "price": "5.50", "category": "%s"}\n\n'
+            '{"name": "Desk", "price": 40, "amount": 2}\n' % self.category.slug,
+            bulk.NDJSON,
+        )
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('name', 'amount', 'category')),
+            [('Lamp', 1, self.category.id), ('Desk', 2, None)],
+        )
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        result = self.run_import(
+            '{"name": "Lamp", "price": "5"}\n'
+            '{"name": "Desk"\n'
+            '["Chair", 9]\n'
+            '{"name": "Sofa", "price": "-1"}\n'
+            '{"name": "Rug", "price": "4", "category": "garden"}\n',
+            bulk.NDJSON,
+        )
+        self.assertEqual((result['created'], result['failed']), (1, 4))
+        errors = {error['line']: error['errors'] for error in result['errors']}
+        self.assertEqual(sorted(errors), [2, 3, 4, 5])
+        self.assertIn('Invalid JSON', errors[2]['non_field_errors'][0])
+        self.assertEqual(errors[3], {'non_field_errors': ["Each line must be a JSON object."]})
+        self.assertIn('price', errors[4])
+        self.assertEqual(errors[5], {'category': ["Unknown category."]})
+
+        result = self.run_import('name,price\nLamp,5\n,3\n')
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(result['errors'][0]['line'], 3)
+        self.assertIn('name', result['errors'][0]['errors'])
+
+    def test_slug_collisions_get_suffixes(self):
+        for slug in ('lamp', 'lamp-2'):
+            Product.objects.create(merchant=self.merchant, name='Lamp', slug=slug, price=5)
+        # Two rows collide within the first chunk, the third with rows
+        # inserted by that chunk.
+        self.run_import('name,price\nLamp,5\nLamp,5\nLamp,5\n', chunk_size=2)
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('slug', flat=True)),
+            ['lamp', 'lamp-2', 'lamp-1', 'lamp-3', 'lamp-4'],
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FacetCountTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        with mock.patch('account.signals.send_email_task'):
+            cls.merchants = [
+                User.objects.create_user(
+                    email=f'merchant{i}@example.com', password='pass', roles=User.Roles.MERCHANT,
+                ).merchant_profile
+                for i in range(2)
+            ]
+            cls.customer = User.objects.create_user(email='customer@example.com', password='pass')
+        cls.books = Category.objects.create(name='Books')
+        cls.games = Category.objects.create(name='Games')
+        for merchant, category, price, amount in (
+            (0, cls.books, 10, 1),
+            (1, cls.books, 30, 0),
+            (0, cls.games, 10, 2),
+            (1, cls.games, 60, 1),
+        ):
+            Product.objects.create(
+                merchant=cls.merchants[merchant], category=category,
+                name=f'{category.name} {price}', price=price, amount=amount,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.customer)
+
+    def facets(self, **params):
+        response = self.client.get(reverse('product:product-facets'), params)
+        self.assertEqual(response.status_code, 200)
+        counts = {
+            facet: {option['value']: option['count'] for option in response.data[facet]}
+            for facet in ('category', 'merchant', 'price', 'in_stock')
+        }
+        return response.data['total'], counts
+
+    def test_each_facet_ignores_only_its_own_filter(self):
+        total, counts = self.facets(category=self.books.slug, price='0-25')
+        self.assertEqual(total, 1)
+        # Categories apply the price filter: one cheap product in each.
+        self.assertEqual(counts['category'], {self.books.slug: 1, self.games.slug: 1})
+        # Price bands apply the category filter: both books.
+        self.assertEqual(
+            counts['price'], {'0-25': 1, '25-50': 1, '50-100': 0, '100-250': 0, '250+': 0},
+        )
+        # Facets without a selection apply both filters.
+        self.assertEqual(counts['merchant'], {self.merchants[0].id: 1, self.merchants[1].id: 0})
+        self.assertEqual(counts['in_stock'], {True: 1, False: 0})
+
+    def test_no_filters(self):
+        total, counts = self.facets()
+        self.assertEqual(total, 4)
+        self.assertEqual(counts['category'], {self.books.slug: 2, self.games.slug: 2})
+        self.assertEqual(counts['in_stock'], {True: 3, False: 1})
@@ -11,6 +11,8 @@ urlpatterns = [
 
     # ---- Product endpoints ----
     path('products/', ProductListAPIView.as_view(), name='product-list-create'),
+    path('products/autocomplete/', ProductAutocompleteAPIView.as_view(), name='product-autocomplete'),
+    path('products/facets/', ProductFacetsAPIView.as_view(), name='product-facets'),
     path('products/<slug:slug>/', ProductRetrieveAPIView.as_view(), name='product-detail'),
     path('products/rate/<slug:slug>/', ProductRatingListCreateAPIView.as_view(), name='product-rate'),
     path('products/rate/update/',ProductRatingsRetrieveUpdateDestroyAPIView.as_view,name='update-rate')
@@ -1,14 +1,26 @@
-from django.core.cache import cache
+from src.cache import get_or_compute, local_get
+from rest_framework.response import Response
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView , ListAPIView,RetrieveAPIView,CreateAPIView
 from rest_framework.filters import SearchFilter, OrderingFilter
 from .models import Category, Product , ProductRating
-from .serializers import CategorySerializer, ProductSerializer,ProductRatingSerializer
+from .serializers import CategorySerializer, ProductSerializer, ProductListSerializer, ProductRatingSerializer
 from .permissions import IsAdminOrReadOnly, IsMerchant
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.throttling import UserRateThrottle
+from rest_framework.throttling import UserRateThrottle, ScopedRateThrottle
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import ValidationError
 from recommendations.task import log_user_action
+from .search import ProductSearchFilter
+from src.pagination import ProductCursorPagination
+from .listing import listing_values
+from .stock import merge_stock
+from src.conditional import conditional_response, make_etag
+from django.utils.dateparse import parse_datetime
+from .autocomplete import MAX_SUGGESTIONS, suggest
+from .facets import IN_STOCK, ProductFacetFilter, facet_counts, parse_filters
+from .cache import category_list_key, facets_key, product_detail_key, product_list_key, ratings_key
 
 
 
@@ -20,12 +32,15 @@ class CategoryListCreateAPIView(ListCreateAPIView):
 
 
     def get_queryset(self):
-        cache_key = 'categories_list'
-        categories = cache.get(cache_key)
-        if not categories:
-            categories = list(Category.objects.all())
-            cache.set(cache_key, categories, timeout=60 * 30)  
-        return categories
+        return local_get(
+            category_list_key(),
+            lambda: list(Category.objects.all()),
+            timeout=60 * 30,
+        )
+
+    def list(self, request, *args, **kwargs):
+        etag = make_etag(category_list_key(), sorted(request.query_params.items()))
+        return conditional_response(request, lambda: super(CategoryListCreateAPIView, self).list(request, *args, **kwargs), etag)
 
 
 class CategoryRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
@@ -36,80 +51,119 @@ class CategoryRetrieveUpdateDestroyAPIView(RetrieveUpdateDestroyAPIView):
     throttle_classes = [UserRateThrottle]
 
 
-    def perform_update(self, serializer):
-        response = super().perform_update(serializer)
-        cache.delete('categories_list') 
-        return response
-
-    def perform_destroy(self, instance):
-        response = super().perform_destroy(instance)
-        cache.delete('categories_list')
-        return response
-
-
 # ---------- Product Views ----------
 class ProductListAPIView(ListAPIView):
-    serializer_class = ProductSerializer
-    filter_backends = [SearchFilter, OrderingFilter]
+    serializer_class = ProductListSerializer
+    filter_backends = [ProductFacetFilter, ProductSearchFilter, OrderingFilter]
     search_fields = ['name', 'description']
-    ordering_fields = ['price', 'created_at']
+    # Ties (e.g. every unrated product) are paged by the (field, id) keyset.
+    ordering_fields = ['price', 'created_at', 'rating_avg']
+    pagination_class = ProductCursorPagination
     throttle_classes = [UserRateThrottle]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        category_slug = self.request.query_params.get('category')
-        cache_key = f'products_{category_slug or "all"}'
-        products = cache.get(cache_key)
+        return listing_values()
+
+    def list(self, request, *args, **kwargs):
+        params = request.query_params
+        if params.get(ProductSearchFilter.search_param) or params.get(IN_STOCK):
+            # Searches go straight to the indexed column, and which products
+            # are in stock changes too often for a cached page; neither is cached.
+            return super().list(request, *args, **kwargs)
+
+        category_slug = request.query_params.get('category')
+        key = product_list_key(category_slug, request.query_params)
+        data = get_or_compute(
+            key,
+            lambda: super(ProductListAPIView, self).list(request, *args, **kwargs).data,
+            timeout=60 * 60,
+        )
+        # Pages are cached as static content; stock is always live.
+        merge_stock(data['results'])
+        etag = make_etag(key, [(row['id'], row['amount']) for row in data['results']])
+        return conditional_response(request, lambda: Response(data), etag)
+
+
+
+class ProductFacetsAPIView(APIView):
+    """
+    Facet counts for the product listing: takes the same ``search`` and
+    facet parameters as the product list (see ``product.facets``).
+    """
+    throttle_classes = [UserRateThrottle]
+    permission_classes = [IsAuthenticated]
 
-        if not products:
-            queryset = Product.objects.select_related('category', 'merchant').all()
-            if category_slug:
-                queryset = queryset.filter(category__slug=category_slug)
-            products = list(queryset)
-            cache.set(cache_key, products, timeout=60 * 5)
-        return products
+    def get(self, request):
+        filters = parse_filters(request.query_params)
 
+        def compute():
+            queryset = ProductSearchFilter().filter_queryset(request, Product.objects.all(), self)
+            return facet_counts(queryset, filters)
 
+        # Short-lived: in-stock counts move with every reservation.
+        data = get_or_compute(facets_key(request.query_params), compute, timeout=60)
+        return Response(data)
 
-class ProductRetrieveAPIView(RetrieveAPIView):
-    queryset = Product.objects.select_related('category', 'merchant').all()
-    serializer_class = ProductSerializer
-    lookup_field = 'slug'
-    throttle_classes = [UserRateThrottle]
+
+
+class ProductAutocompleteAPIView(APIView):
+    """
+    Search-as-you-type suggestions (products and categories) for ``?q=``.
+    Served from the Redis index only; the token is checked without loading
+    the user, so the database is never touched.
+    """
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'autocomplete'
 
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = int(request.query_params.get('limit', MAX_SUGGESTIONS))
+        except ValueError:
+            raise ValidationError({'limit': "Must be an integer."})
+        return Response({'query': query, 'results': suggest(query, max(limit, 1))})
 
-    def get_object(self):
-        slug = self.kwargs['slug']
-        key_cache = f"product_{slug}"
 
-        product = cache.get(key_cache)
 
-        if not product:
-            product = get_object_or_404(Product, slug=slug)
-            cache.set(key_cache, ProductSerializer(product).data, timeout=3600)
+class ProductRetrieveAPIView(RetrieveAPIView):
+    queryset = Product.objects.select_related('category', 'merchant__user').all()
+    serializer_class = ProductSerializer
+    lookup_field = 'slug'
+    throttle_classes = [UserRateThrottle]
+    permission_classes = [IsAuthenticated]
 
-        
-        return product 
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        response = super().retrieve(request, *args, **kwargs)
+        slug = self.kwargs['slug']
+        key = product_detail_key(slug)
+        data = get_or_compute(
+            key,
+            lambda: self.get_serializer(get_object_or_404(self.get_queryset(), slug=slug)).data,
+            timeout=60 * 60 * 6,
+        )
+        merge_stock([data])
+        # Stock moves don't touch updated_at; the ETag covers them and takes
+        # precedence over If-Modified-Since.
+        etag = make_etag(key, data['amount'])
+        last_modified = parse_datetime(data['updated_at']) if data.get('updated_at') else None
 
         try:
             session_id = getattr(request.session, 'session_key', None)
             user_id = request.user.id if request.user and request.user.is_authenticated else None
             log_user_action.delay(
                 user_id=user_id,
-                product_id=instance.id,
+                product_id=data['id'],
                 action='view',
                 session_id=session_id,
-                metadata={'source': 'product_detail', 'slug': instance.slug}
+                metadata={'source': 'product_detail', 'slug': slug}
             )
         except Exception:
             pass
 
-        return response
+        return conditional_response(request, lambda: Response(data), etag, last_modified)
 
 
 
@@ -120,13 +174,11 @@ class ProductRatingListCreateAPIView(ListCreateAPIView):
     def get_queryset(self):
         slug = self.kwargs['slug']
         product = get_object_or_404(Product, slug=slug)
-        cache_key = f"ratings_{slug}"
-
-        ratings = cache.get(cache_key)
-        if not ratings:
-            ratings = list(ProductRating.objects.filter(product=product))
-            cache.set(cache_key, ratings, timeout=60 * 10)  
-        return ratings
+        return get_or_compute(
+            ratings_key(product.id),
+            lambda: list(ProductRating.objects.filter(product=product)),
+            timeout=60 * 10,
+        )
 
     def perform_create(self, serializer):
         slug = self.kwargs['slug']
@@ -135,8 +187,6 @@ class ProductRatingListCreateAPIView(ListCreateAPIView):
 
         if hasattr(user, 'profile'):
             serializer.save(user=user.profile, product=product)
-            # invalidate cache when new rating added
-            cache.delete(f"ratings_{slug}")
         else:
             raise ValidationError({"detail": "User profile not found."})
 
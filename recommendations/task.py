@@ -41,6 +41,29 @@ def log_user_action(self, user_id=None, product_id=None, order_item_id=None, act
         self.retry(exc=e, countdown=10)
         return f"Email sending failed: {e}"
 
+@shared_task(bind=True, max_retries=3)
+def log_user_actions(self, events):
+    """
+    Bulk variant of ``log_user_action`` for requests that touch several products.
+    ``events`` is a list of dicts with the same keyword arguments.
+    """
+    try:
+        actions = [
+            UserAction(
+                user_id=event.get('user_id'),
+                product_id=event.get('product_id'),
+                order_item_id=event.get('order_item_id'),
+                action=event.get('action', 'view'),
+                session_id=event.get('session_id'),
+                metadata=event.get('metadata') or {},
+            )
+            for event in events
+        ]
+        UserAction.objects.bulk_create(actions)
+        return len(actions)
+    except Exception as e:
+        self.retry(exc=e, countdown=10)
+
 @shared_task
 def compute_item_similarity(model_version="v1"):
     """
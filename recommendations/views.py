@@ -7,11 +7,14 @@ from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework import status
 from .models import ItemSimilarity, Product
-from product.serializers import ProductSerializer
+from product.serializers import ProductListSerializer
+from product.listing import listing_values
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.core.cache import cache
+from src.cache import get_or_compute
+from src.conditional import conditional_response, make_etag
+from src.pagination import ProductCursorPagination
 
 
 class SimilarProduct(ListAPIView):
@@ -20,27 +23,25 @@ class SimilarProduct(ListAPIView):
 
     def get_queryset(self):
         slug = self.kwargs.get('slug')
-        key = f"similar_to_{slug}"
-        data = cache.get(key)
-
-        if not data:
-            try:
-                product = Product.objects.get(slug=slug)
-            except Product.DoesNotExist:
-                return ItemSimilarity.objects.none()
-
-            data = list(ItemSimilarity.objects.filter(product_slug=product.slug))
-            cache.set(key, data, timeout=60 * 60 * 24 * 2)
-
-        return data
+        return get_or_compute(
+            f"similar_to_{slug}",
+            lambda: list(ItemSimilarity.objects.filter(product__slug=slug)),
+            timeout=60 * 60 * 24 * 2,
+        )
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         if not queryset:
             return Response({'message': 'No similar products found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        etag = make_etag(self.kwargs.get('slug'), [
+            (item.similar_product_id, item.score, item.model_version) for item in queryset
+        ])
+        return conditional_response(
+            request,
+            lambda: Response(self.get_serializer(queryset, many=True).data, status=status.HTTP_200_OK),
+            etag,
+        )
 
 
 
@@ -48,8 +49,9 @@ class SimilarProduct(ListAPIView):
 
 
 class UserRecommendationsView(ListAPIView):
-    serializer_class = ProductSerializer
+    serializer_class = ProductListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ProductCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -73,11 +75,11 @@ class UserRecommendationsView(ListAPIView):
         )
 
         
-        return Product.objects.filter(id__in=similar_ids).exclude(id__in=interacted)
+        return listing_values(Product.objects.filter(id__in=similar_ids).exclude(id__in=interacted))
 
 
 class RecentViewedProducts(ListAPIView):
-    serializer_class = ProductSerializer
+    serializer_class = ProductListSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -93,8 +95,7 @@ class RecentViewedProducts(ListAPIView):
         product_ids = list(recent_viewed_products[:20])
 
 
-        products = Product.objects.filter(id__in=product_ids)
-        products = sorted(products, key=lambda p: product_ids.index(p.id))
-
-        return products
+        position = {product_id: index for index, product_id in enumerate(product_ids)}
+        products = listing_values(Product.objects.filter(id__in=product_ids))
+        return sorted(products, key=lambda p: position[p['id']])
 
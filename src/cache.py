@@ -0,0 +1,214 @@
+"""
+Cache helpers shared by the apps.
+
+``get_or_compute`` protects hot keys from stampedes in two ways:
+
+* single flight: on a miss only the worker that wins a short lock runs
+  ``compute``; the others wait briefly for its result instead of all hitting
+  the database at once;
+* probabilistic early refresh (XFetch): shortly before an entry expires, a
+  request may volunteer to recompute it while everyone else keeps being
+  served the current value, so hot keys rarely expire at all.
+
+``local_get`` adds a small in-process tier (L1) in front of Redis for tiny,
+near-static values such as the category list, coupons and cache generations.
+``invalidate_local`` drops keys from L1 in this process and broadcasts them
+over Redis pub/sub so every web and Celery worker drops them too. L1 entries
+also expire after ``LOCAL_TIMEOUT`` in case a broadcast is missed.
+"""
+import logging
+import math
+import random
+import threading
+import time
+from cachetools import TTLCache
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+
+logger = logging.getLogger(__name__)
+
+
+LOCK_TIMEOUT = 10  # seconds a recompute may hold the lock
+WAIT_TIMEOUT = 2  # seconds to wait for another worker's recompute
+WAIT_INTERVAL = 0.05
+EARLY_REFRESH_BETA = 1.0
+
+
+def _lock_key(key):
+    return f'lock_{key}'
+
+
+def _acquire(key):
+    # ``add`` is SET NX on Redis, so exactly one caller gets the lock.
+    return cache.add(_lock_key(key), 1, timeout=LOCK_TIMEOUT)
+
+
+def _release(key):
+    cache.delete(_lock_key(key))
+
+
+def _compute_and_store(key, compute, timeout):
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    cache.set(key, (value, delta, time.time() + timeout), timeout=timeout)
+    return value
+
+
+def _should_refresh_early(delta, expires_at, beta):
+    # random() is in [0, 1) so guard the log against 0.
+    return time.time() - delta * beta * math.log(random.random() or 1e-12) >= expires_at
+
+
+def get_or_compute(key, compute, timeout, beta=EARLY_REFRESH_BETA):
+    """
+    Return the cached value for ``key``, calling ``compute()`` to build it
+    when it is missing or about to expire. ``compute`` runs at most once at a
+    time per key across all workers.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires_at = entry
+        if not _should_refresh_early(delta, expires_at, beta):
+            return value
+        if _acquire(key):
+            try:
+                return _compute_and_store(key, compute, timeout)
+            finally:
+                _release(key)
+        return value
+
+    if _acquire(key):
+        try:
+            return _compute_and_store(key, compute, timeout)
+        finally:
+            _release(key)
+
+    deadline = time.time() + WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+
+    # The lock holder is slow or died; don't make the request fail for it.
+    return compute()
+
+
+LOCAL_MAXSIZE = 1024
+LOCAL_TIMEOUT = 30  # upper bound on staleness if an invalidation is missed
+INVALIDATION_CHANNEL = 'cache_invalidations'
+
+
+def _redis():
+    # Raises NotImplementedError when the default cache isn't django-redis
+    # (e.g. locmem in tests); L1 then relies on LOCAL_TIMEOUT alone.
+    return get_redis_connection('default')
+
+
+class LocalCache:
+    """Per-process TTL cache kept coherent through Redis pub/sub."""
+
+    def __init__(self, maxsize=LOCAL_MAXSIZE, ttl=LOCAL_TIMEOUT):
+        self._data = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a value read from Redis before an
+        # invalidation arrived is not written back into L1 afterwards.
+        self._epoch = 0
+        self._listener = None
+        self._enabled = True
+
+    @property
+    def epoch(self):
+        return self._epoch
+
+    def get_many(self, keys):
+        self._ensure_listener()
+        with self._lock:
+            return {key: self._data[key] for key in keys if key in self._data}
+
+    def set_many(self, values, epoch):
+        with self._lock:
+            if epoch != self._epoch:
+                return
+            self._data.update(values)
+
+    def discard(self, keys):
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._data.clear()
+
+    def _ensure_listener(self):
+        # Started lazily so it runs in the forked gunicorn/celery worker,
+        # not in the master process.
+        if not self._enabled or (self._listener and self._listener.is_alive()):
+            return
+        with self._lock:
+            if not self._enabled or (self._listener and self._listener.is_alive()):
+                return
+            self._listener = threading.Thread(
+                target=self._listen, name='cache-invalidation', daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = _redis().pubsub(ignore_subscribe_messages=True)
+            except NotImplementedError:
+                self._enabled = False
+                return
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything published while we were not subscribed is lost.
+                self.clear()
+                for message in pubsub.listen():
+                    self.discard(message['data'].decode().split('\n'))
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+
+local_cache = LocalCache()
+
+
+def local_get_many(keys, fetch):
+    """
+    Return ``{key: value}`` for ``keys`` from L1, calling ``fetch(missing)``
+    for the rest and keeping what it returns in L1.
+    """
+    found = local_cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        epoch = local_cache.epoch
+        fetched = fetch(missing)
+        local_cache.set_many(fetched, epoch)
+        found.update(fetched)
+    return found
+
+
+def local_get(key, compute, timeout, beta=EARLY_REFRESH_BETA):
+    """``get_or_compute`` with an in-process tier in front of it."""
+    return local_get_many(
+        [key], lambda missing: {key: get_or_compute(key, compute, timeout, beta)}
+    )[key]
+
+
+def invalidate_local(*keys):
+    """Drop ``keys`` from L1 in this process and every other worker."""
+    if not keys:
+        return
+    local_cache.discard(keys)
+    try:
+        _redis().publish(INVALIDATION_CHANNEL, '\n'.join(keys))
+    except NotImplementedError:
+        pass
@@ -21,4 +21,24 @@ app.conf.beat_schedule = {
         'schedule': crontab(minute=0, hour='*/50'),  
         'args': (), 
     },
+    'release_expired_cart_reservations': {
+        'task': 'cart.tasks.release_expired_reservations',
+        'schedule': crontab(minute='*/10'),
+        'args': (),
+    },
+    'rebuild_autocomplete_index_nightly': {
+        'task': 'product.tasks.rebuild_autocomplete_index',
+        'schedule': crontab(minute=30, hour=3),
+        'args': (),
+    },
+    'relay_order_outbox': {
+        'task': 'order.tasks.relay_outbox',
+        'schedule': 5.0,
+        'args': (),
+    },
+    'purge_order_outbox_daily': {
+        'task': 'order.tasks.purge_outbox',
+        'schedule': crontab(minute=0, hour=4),
+        'args': (),
+    },
 }
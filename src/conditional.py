@@ -0,0 +1,33 @@
+"""
+Conditional GET for API views.
+
+Views compute their validators from data they already have at hand (cache
+keys that embed generations, live stock, cached documents) and call
+``conditional_response``; a matching ``If-None-Match`` / ``If-Modified-Since``
+is answered with 304 before the response body is built or rendered.
+"""
+from hashlib import md5
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Quoted ETag derived from ``repr`` of ``parts``."""
+    return quote_etag(md5(repr(parts).encode()).hexdigest())
+
+
+def conditional_response(request, build, etag=None, last_modified=None):
+    """
+    Return a 304 (or 412) response when the request's preconditions say the
+    client's copy is current, otherwise ``build()``. Either way the response
+    carries ``ETag`` / ``Last-Modified`` (an aware datetime) when given.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+    if etag:
+        response.headers['ETag'] = etag
+    if timestamp:
+        response.headers['Last-Modified'] = http_date(timestamp)
+    return response
@@ -0,0 +1,101 @@
+"""
+Idempotency keys for unsafe endpoints.
+
+A client that may retry a request (e.g. after a timeout on a mobile network)
+sends an ``Idempotency-Key`` header with a value unique to the operation.
+The first request with a key runs normally and, when it succeeds, its
+response is stored for ``IDEMPOTENCY_TIMEOUT``; retries with the same key get
+the stored response back (marked ``Idempotent-Replayed: true``) without
+running the view again.
+
+While the first request is still running the key is locked, so a concurrent
+retry gets a 409 instead of a second order. Keys are scoped to the view and
+the user, and reusing one with a different payload is rejected with 422.
+Failed requests aren't stored: the client may fix the request and retry
+with the same key. Requests without the header are not affected.
+"""
+from hashlib import md5
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_TIMEOUT = 60 * 60 * 24
+LOCK_TIMEOUT = 60  # seconds a request may hold its key
+MAX_KEY_LENGTH = 255
+
+
+def _fingerprint(request):
+    """Digest of what the request asks for; uploaded files count by name and size."""
+    data = []
+    for name in sorted(request.data.keys()):
+        value = request.data[name]
+        if hasattr(value, 'read'):
+            value = (getattr(value, 'name', None), getattr(value, 'size', None))
+        data.append((name, repr(value)))
+    return md5(repr((request.method, request.path, data)).encode()).hexdigest()
+
+
+def _error(message, status_code):
+    return Response(
+        {'message': 'Invalid Request', 'errors': {IDEMPOTENCY_HEADER: [message]}},
+        status=status_code,
+    )
+
+
+class IdempotentCreateMixin:
+    """Makes a ``CreateAPIView`` honour the ``Idempotency-Key`` header."""
+
+    def get_idempotency_key(self, request, key):
+        return f'idempotency:{type(self).__name__}:{request.user.pk}:{md5(key.encode()).hexdigest()}'
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return _error(f"Must be 1 to {MAX_KEY_LENGTH} characters long.", status.HTTP_400_BAD_REQUEST)
+
+        cache_key = self.get_idempotency_key(request, key)
+        fingerprint = _fingerprint(request)
+        replay = self._replay(cache_key, fingerprint)
+        if replay is not None:
+            return replay
+
+        lock_key = f'{cache_key}:lock'
+        # ``add`` is SET NX on Redis, so only one request holds the key.
+        if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            return _error("A request with this key is still in progress.", status.HTTP_409_CONFLICT)
+        try:
+            # The first request may have finished between the read and the lock.
+            replay = self._replay(cache_key, fingerprint)
+            if replay is not None:
+                return replay
+            response = super().create(request, *args, **kwargs)
+            if status.is_success(response.status_code):
+                cache.set(cache_key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                    'headers': {
+                        name: value for name, value in response.headers.items()
+                        if name in ('Location',)
+                    },
+                }, timeout=IDEMPOTENCY_TIMEOUT)
+            return response
+        finally:
+            cache.delete(lock_key)
+
+    def _replay(self, cache_key, fingerprint):
+        stored = cache.get(cache_key)
+        if stored is None:
+            return None
+        if stored['fingerprint'] != fingerprint:
+            return _error(
+                "This key was already used with a different request.",
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        response = Response(stored['data'], status=stored['status'], headers=stored['headers'])
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
@@ -0,0 +1,108 @@
+"""
+Short public ids allocated without probing the database.
+
+An id is ``<day><number>`` in base62: three characters for the day since
+``EPOCH`` (so ids sort roughly by creation date) followed by seven
+characters for a sequence number run through a keyed Feistel permutation of
+``[0, 2**40)``. The permutation is a bijection, so distinct sequence numbers
+never collide, yet consecutive numbers look random to anyone without
+``SECRET_KEY``.
+
+Sequence numbers come from a counter per id kind in the cache (``INCRBY`` on
+Redis). Each process leases ``BLOCK_SIZE`` numbers at a time and hands them
+out from memory, so allocating an id usually costs no round trip at all.
+A missing counter (e.g. after Redis was flushed) restarts from a value
+derived from the clock, above anything handed out before.
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+
+
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+DAY_LENGTH = 3
+NUMBER_LENGTH = 7
+ID_LENGTH = DAY_LENGTH + NUMBER_LENGTH
+
+HALF_BITS = 20  # the permutation works on 40-bit numbers
+FEISTEL_ROUNDS = 4
+BLOCK_SIZE = 100
+# Counter floor per second since EPOCH; allocating faster than this for long
+# enough to matter would be needed to reuse numbers after a counter reset.
+SEED_RATE = 1000
+
+_lock = threading.Lock()
+_blocks = {}
+
+
+def _reset_blocks():
+    # A forked worker must not hand out the numbers its parent leased.
+    _blocks.clear()
+
+
+os.register_at_fork(after_in_child=_reset_blocks)
+
+
+def base62(number, length):
+    chars = []
+    for _ in range(length):
+        number, digit = divmod(number, 62)
+        chars.append(ALPHABET[digit])
+    if number:
+        raise ValueError("Number too large for the requested length.")
+    return ''.join(reversed(chars))
+
+
+def _round_key(kind):
+    return hmac.new(settings.SECRET_KEY.encode(), f'ids:{kind}'.encode(), hashlib.sha256).digest()
+
+
+def permute(number, kind):
+    """Keyed bijection of ``[0, 2**40)``; different kinds use different keys."""
+    mask = (1 << HALF_BITS) - 1
+    key = _round_key(kind)
+    left, right = number >> HALF_BITS, number & mask
+    for round_ in range(FEISTEL_ROUNDS):
+        digest = hmac.new(key, f'{round_}:{right}'.encode(), hashlib.sha256).digest()
+        left, right = right, left ^ (int.from_bytes(digest[:4], 'big') & mask)
+    return (left << HALF_BITS) | right
+
+
+def _counter_key(kind):
+    return f'ids:seq:{kind}'
+
+
+def _lease(kind):
+    """Reserve ``BLOCK_SIZE`` sequence numbers; returns ``[next, end)``."""
+    key = _counter_key(kind)
+    try:
+        end = cache.incr(key, BLOCK_SIZE)
+    except ValueError:
+        floor = int((time.time() - EPOCH.timestamp()) * SEED_RATE)
+        # Only the first process to notice the missing counter seeds it.
+        cache.add(key, floor, timeout=None)
+        end = cache.incr(key, BLOCK_SIZE)
+    return [end - BLOCK_SIZE, end]
+
+
+def next_number(kind):
+    with _lock:
+        block = _blocks.get(kind)
+        if block is None or block[0] >= block[1]:
+            block = _blocks[kind] = _lease(kind)
+        number = block[0]
+        block[0] += 1
+    return number
+
+
+def new_id(kind):
+    """Return a new ``ID_LENGTH`` character id, unique among ids of ``kind``."""
+    day = (datetime.now(timezone.utc) - EPOCH).days
+    number = next_number(kind) % (1 << (2 * HALF_BITS))
+    return base62(day, DAY_LENGTH) + base62(permute(number, kind), NUMBER_LENGTH)
@@ -0,0 +1,131 @@
+from base64 import b64decode, b64encode
+from urllib import parse
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else f'-{field}' for field in ordering)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination: the cursor holds the ``(value, id)`` of the last row
+    and the next page is fetched with
+    ``WHERE field > value OR (field = value AND id > id)``
+    (comparisons flipped for descending orderings), which the composite
+    ``(<field>, id)`` indexes answer without ``COUNT(*)`` or ``OFFSET``,
+    however many rows share a value.
+
+    Follows ``?ordering=`` when the view exposes an ``OrderingFilter`` and
+    always appends ``id`` as a tie-breaker in the same direction. Ordering
+    fields must be non-null.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        first = ordering[0]
+        tie_breaker = '-id' if first.startswith('-') else 'id'
+        if first.lstrip('-') == 'id':
+            return ordering[:1]
+        return ordering[:1] + (tie_breaker,)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            try:
+                queryset = queryset.filter(self._seek(ordering, self.cursor.position))
+            except (TypeError, ValueError, DjangoValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _seek(self, ordering, position):
+        """Rows strictly after ``position`` in ``ordering``."""
+        value, pk = position
+        field = ordering[0].lstrip('-')
+        op = 'lt' if ordering[0].startswith('-') else 'gt'
+        if len(ordering) == 1:
+            return Q(**{f'{field}__{op}': value})
+        tie_op = 'lt' if ordering[1].startswith('-') else 'gt'
+        return Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{tie_op}': pk})
+
+    def _position(self, item):
+        field = self.ordering[0].lstrip('-')
+        if isinstance(item, dict):
+            return str(item[field]), str(item['id'])
+        return str(getattr(item, field)), str(item.pk)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._position(self.page[-1]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._position(self.page[0]) if self.page else self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            position = (tokens['p'][0], int(tokens['i'][0]))
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        value, pk = cursor.position
+        tokens = {'p': value, 'i': pk}
+        if cursor.reverse:
+            tokens['r'] = '1'
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+
+class ProductCursorPagination(KeysetPagination):
+    """Keyset pagination for product listings; search results page by rank."""
+
+    def get_ordering(self, request, queryset, view):
+        explicit = request.query_params.get(api_settings.ORDERING_PARAM)
+        if not explicit and 'rank' in queryset.query.annotations:
+            return ('-rank', '-id')
+        return super().get_ordering(request, queryset, view)
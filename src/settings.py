@@ -176,6 +176,7 @@ REST_FRAMEWORK = {
         'anon': '100/day',
         'user': '1000/day',
         'login':'5/minute',
+        'autocomplete': '120/minute',
     },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -0,0 +1,46 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from . import ids
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IdTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        ids._reset_blocks()
+        self.addCleanup(ids._reset_blocks)
+
+    def test_permute_is_a_bijection(self):
+        # Shrink the permutation to [0, 2**10) so it can be checked exhaustively.
+        with mock.patch('src.ids.HALF_BITS', 5):
+            for kind in ('order', 'referral'):
+                permuted = [ids.permute(number, kind) for number in range(1 << 10)]
+                self.assertEqual(sorted(permuted), list(range(1 << 10)))
+            self.assertNotEqual(
+                [ids.permute(number, 'order') for number in range(16)],
+                [ids.permute(number, 'referral') for number in range(16)],
+            )
+
+    def test_new_ids_are_unique_across_blocks(self):
+        generated = []
+        with mock.patch('src.ids.BLOCK_SIZE', 5):
+            for i in range(23):
+                if i % 7 == 6:
+                    # A forked worker drops the rest of its block and leases a new one.
+                    ids._reset_blocks()
+                generated.append(ids.new_id('order'))
+        self.assertEqual(len(set(generated)), len(generated))
+        for value in generated:
+            self.assertEqual(len(value), ids.ID_LENGTH)
+            self.assertTrue(set(value) <= set(ids.ALPHABET))
+
+    def test_base62(self):
+        self.assertEqual(ids.base62(61, 2), '0z')
+        self.assertEqual(ids.base62(62, 2), '10')
+        with self.assertRaises(ValueError):
+            ids.base62(62 ** 2, 2)